@@ -0,0 +1,118 @@
+from __future__ import annotations
+from collections.abc import Iterator
+
+from boundary import Cell
+from propagation import Constraint
+
+
+# the number of search steps between two pauses, see search
+_PAUSE = 256
+
+
+def search(cells: list[Cell], constraints: list[Constraint]) \
+        -> Iterator[int | None]:
+    """
+    Yield every configuration of cells satisfying constraints, as a bitmap
+    whose i-th bit tells whether cells[i] is a mine, and None every _PAUSE
+    steps of the search, so that a caller can stop it in between even when
+    the solutions are far apart.
+
+    The cells are decided depth-first, empty first. Every constraint keeps
+    the number of mines it still needs and the number of its undecided
+    cells. A decision updates only the constraints watching the cell, a
+    constraint needing no more mines (or all of its cells) forces its
+    remaining cells and a constraint needing a negative number of mines (or
+    more than it has cells) is a conflict. The decisions and forced cells
+    are kept on a trail, so the memory is proportional to the number of
+    cells, not to the number of solutions.
+    """
+    n = len(cells)
+    index = {cell: i for i, cell in enumerate(cells)}
+    members = [[index[cell] for cell in region] for _, region in constraints]
+    # i: indices of the constraints containing cells[i]
+    watched: list[list[int]] = [[] for _ in cells]
+    for c, region in enumerate(members):
+        for i in region:
+            watched[i].append(c)
+    need = [value for value, _ in constraints]
+    free = [len(region) for region in members]
+    # -1 for undecided cells, otherwise 0 or 1
+    value = [-1] * n
+    trail: list[int] = []
+    mines = 0
+
+    def forced(c: int) -> list[tuple[int, int]]:
+        """The cells of c that are decided by its counters."""
+        if free[c] and (need[c] == 0 or need[c] == free[c]):
+            mine = 1 if need[c] else 0
+            return [(i, mine) for i in members[c] if value[i] < 0]
+        return []
+
+    def assign(pending: list[tuple[int, int]]) -> bool:
+        """Decide the pending cells and all they force, False on conflict."""
+        nonlocal mines
+        while pending:
+            i, mine = pending.pop()
+            if value[i] >= 0:
+                if value[i] != mine:
+                    return False
+                continue
+            value[i] = mine
+            trail.append(i)
+            mines |= mine << i
+            conflict = False
+            for c in watched[i]:
+                free[c] -= 1
+                need[c] -= mine
+                if need[c] < 0 or need[c] > free[c]:
+                    conflict = True
+            if conflict:
+                return False
+            for c in watched[i]:
+                pending.extend(forced(c))
+        return True
+
+    def undo(mark: int) -> None:
+        """Undecide the cells decided after the trail had length mark."""
+        nonlocal mines
+        while len(trail) > mark:
+            i = trail.pop()
+            mine = value[i]
+            value[i] = -1
+            mines &= ~(1 << i)
+            for c in watched[i]:
+                free[c] += 1
+                need[c] += mine
+
+    if any(need[c] < 0 or need[c] > free[c] for c in range(len(members))):
+        return
+    if not assign([pair for c in range(len(members)) for pair in forced(c)]):
+        return
+
+    # the decisions whose mine branch has not been tried yet
+    # (cell, length of the trail before the decision)
+    stack: list[tuple[int, int]] = []
+    k = 0
+    steps = 0
+    while True:
+        steps += 1
+        if not steps % _PAUSE:
+            yield None
+        while k < n and value[k] >= 0:
+            k += 1
+        if k < n:
+            stack.append((k, len(trail)))
+            if assign([(k, 0)]):
+                continue
+        else:
+            yield mines
+
+        # backtrack to the deepest decision with an untried branch
+        while stack:
+            k, mark = stack.pop()
+            undo(mark)
+            if assign([(k, 1)]):
+                break
+            undo(mark)
+        else:
+            return
@@ -3,14 +3,22 @@ import curses
 from math import log10
 from typing import Literal
 
+from MyLib.ocurses.curses_utilities import addstr
+
 import configuration as conf
 
 
 class Bar:
     """The object representing the top bar of the application."""
+    BUSY_CHAR: str = '⧗'
+
     def __init__(self, window: curses.window) -> None:
         # the window the Bar will be drawn on.
         self.window = window
+        # whether the busy indicator is shown
+        self.busy: bool = False
+        # the text shown after the mines, see set_readout
+        self.readout: str = ''
         self.mines_digits: int = 0
         self.mines_offset: int = 0
         self.button_offset: int = 0
@@ -59,6 +67,29 @@ class Bar:
             -> None:
         pass
 
+    def set_busy(self, busy: bool) -> None:
+        """Show or hide the indicator that the solver is working."""
+        if busy == self.busy:
+            return
+        self.busy = busy
+        # in the space before the timer
+        addstr(self.window, 0, self.timer_offset - 1,
+               self.BUSY_CHAR if busy else ' ',
+               curses.color_pair(conf.PAIR_BORDER))
+        self.window.noutrefresh()
+
+    def set_readout(self, text: str) -> None:
+        """Show text in the space between the mines and the button."""
+        if text == self.readout:
+            return
+        self.readout = text
+        offset = self.mines_offset + self.mines_digits + 1
+        length = self.button_offset - 1 - offset
+        if length > 0:
+            addstr(self.window, 0, offset, text[:length].ljust(length),
+                   curses.color_pair(conf.PAIR_BORDER))
+            self.window.noutrefresh()
+
     def mouse_press(self, y: int, x: int) -> None:
         pass
 
@@ -0,0 +1,325 @@
+from __future__ import annotations
+import json
+import platform
+import subprocess
+import tracemalloc
+from argparse import ArgumentParser
+from collections.abc import Callable
+from pathlib import Path
+from random import Random
+from time import perf_counter
+from typing import Any, TypeVar
+
+import configuration as conf
+from boundary import UNTOUCHED, Cell
+from game import GameCore, is_pressable
+from memo import get_region_cache
+from solver import SOLVERS, Progress
+
+
+# the boards (height, width) and the ratios of mines of the original
+# difficulties, every pair is a case
+SIZES: list[tuple[int, int]] = [(9, 9), (16, 16), (16, 30)]
+RATIOS: list[float] = [10 / 81, 40 / 256, 99 / 480]
+# (height, width, ratio), the default cases: those and the ratio of the
+# game on the small board. This ratio makes the regions so large that exact
+# solving takes minutes and gigabytes from 12x12 on, see --sizes and
+# --budget.
+CASES: list[tuple[int, int, float]] = [
+    (height, width, ratio) for height, width in SIZES for ratio in RATIOS
+] + [(9, 9, conf.MINE_RATIO)]
+# the parts of a click that are timed:
+#   'click'   the whole GameCore.uncover
+#   'search'  uncovering the cells, GameCore._uncover_search
+#   'update'  feeding them to the solver, GameCore._update_state
+#   'extend'  enumerating the configurations of the regions, a part of update
+PHASES = ('click', 'search', 'update', 'extend')
+
+T = TypeVar('T')
+
+
+class ScriptedGame:
+    """
+    A game of GameCore played by a script, timing each click.
+
+    The script uncovers the first cell the solver proved safe, or a random
+    untouched cell when the untouched cells are safe, or else a random
+    covered cell. Everything random is seeded by seed, so the game replays
+    click by click, on any commit that finds the same safe cells. With a
+    budget the solver gets as far as the speed of the machine allows; how
+    far it got is kept in progress, and a game given it as pace gets as far
+    again, see BoundarySolver.pace.
+    """
+    def __init__(self, height: int, width: int, mines: int, seed: int,
+                 pace: list[Progress] | None = None) -> None:
+        # the regions cached in earlier games would change the draws
+        get_region_cache.cache_clear()
+        self.core = GameCore(height, width, mines, seed)
+        self.random = Random(seed)
+        # phase: the seconds it took on each click
+        self.latencies: dict[str, list[float]] = {phase: []
+                                                  for phase in PHASES}
+        # the most configurations the solver held after a click
+        self.peak_configurations: int = 0
+        # phase: the seconds spent in it during the current click
+        self._spent: dict[str, float] = dict.fromkeys(PHASES, 0.0)
+
+        core = self.core
+        # how far every budget-limited piece of work of the solver got
+        self.progress: list[Progress] = core.solver.reached
+        if pace is not None:
+            core.solver.pace = _pacer(pace)
+        core._uncover_search = self._timed(  # type: ignore[method-assign]
+            'search', core._uncover_search
+        )
+        core._update_state = self._timed(  # type: ignore[method-assign]
+            'update', core._update_state
+        )
+        if hasattr(core.solver, '_enumerate'):
+            core.solver._enumerate = self._timed('extend',
+                                                 core.solver._enumerate)
+
+    def play(self) -> bool:
+        """Click until the game ends, return True if it was won."""
+        core = self.core
+        while core.game_state < 2:
+            y, x = self._next_click()
+            self._spent = dict.fromkeys(PHASES, 0.0)
+            start = perf_counter()
+            core.uncover(y, x)
+            self._spent['click'] = perf_counter() - start
+            for phase, seconds in self._spent.items():
+                self.latencies[phase].append(seconds)
+            core.take_events()
+            self.peak_configurations = max(
+                self.peak_configurations,
+                sum(map(len, getattr(core.solver, 'components', ())))
+            )
+        return core.game_state == 3
+
+    def _next_click(self) -> Cell:
+        core = self.core
+        safe = sorted(cell for cell in core.possible if cell != UNTOUCHED)
+        if safe:
+            return safe[0]
+        covered = [core.topology.cell(i)
+                   for i, number in enumerate(core.minefield)
+                   if is_pressable(number)]
+        if UNTOUCHED in core.possible:
+            covered = [cell for cell in covered
+                       if cell not in core.normal_directions]
+        return self.random.choice(covered)
+
+    def _timed(self, phase: str, function: Callable[..., T]) \
+            -> Callable[..., T]:
+        """Wrap function to add the time of each call to phase."""
+        def timed(*args: Any) -> T:
+            start = perf_counter()
+            try:
+                return function(*args)
+            finally:
+                self._spent[phase] += perf_counter() - start
+        return timed
+
+
+def _pacer(progress: list[Progress]) -> Callable[[], Progress]:
+    """The pace of a solver going as far as progress records."""
+    steps = iter(progress)
+
+    def pace() -> Progress:
+        for reached in steps:
+            return reached
+        raise ValueError('the game went on further than its recorded pace')
+    return pace
+
+
+def summarize(seconds: list[float]) -> dict[str, float]:
+    """The mean, median, 90th and 99th percentile and maximum, in ms."""
+    if not seconds:
+        return {}
+    ordered = sorted(seconds)
+
+    def at(quantile: float) -> float:
+        return ordered[min(int(quantile * len(ordered)), len(ordered) - 1)]
+
+    return {name: round(value * 1000, 4) for name, value in (
+        ('mean', sum(ordered) / len(ordered)), ('p50', at(0.5)),
+        ('p90', at(0.9)), ('p99', at(0.99)), ('max', ordered[-1]),
+    )}
+
+
+def run_case(height: int, width: int, ratio: float, games: int, seed: int,
+             memory: bool = True,
+             paces: list[list[Progress]] | None = None) -> dict[str, Any]:
+    """
+    Play games scripted games on the board, seeded by seed, seed + 1, ...
+    With memory, each game is replayed under tracemalloc for its peak
+    memory, so that tracing does not slow down the timed run; the replay
+    takes the pace of the timed game. Given paces, the progress of earlier
+    games, the games take those.
+    """
+    mines = round(height * width * ratio)
+    latencies: dict[str, list[float]] = {phase: [] for phase in PHASES}
+    wins = 0
+    peak_configurations = 0
+    peak_memory = 0
+    progress = []
+    for i, game_seed in enumerate(range(seed, seed + games)):
+        game = ScriptedGame(height, width, mines, game_seed,
+                            None if paces is None else paces[i])
+        wins += game.play()
+        progress.append(game.progress)
+        for phase in PHASES:
+            latencies[phase].extend(game.latencies[phase])
+        peak_configurations = max(peak_configurations,
+                                  game.peak_configurations)
+        if memory:
+            tracemalloc.start()
+            ScriptedGame(height, width, mines, game_seed,
+                         game.progress.copy()).play()
+            peak_memory = max(peak_memory,
+                              tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+    return {
+        'height': height,
+        'width': width,
+        'mines': mines,
+        'ratio': round(ratio, 4),
+        'games': games,
+        'wins': wins,
+        'clicks': len(latencies['click']),
+        'latency_ms': {phase: summarize(latencies[phase])
+                       for phase in PHASES},
+        'peak_configurations': peak_configurations,
+        'peak_memory': peak_memory if memory else None,
+        'progress': progress,
+    }
+
+
+def _commit() -> str | None:
+    """The commit of the working tree, None outside of git."""
+    try:
+        result = subprocess.run(
+            ['git', 'describe', '--always', '--dirty'], capture_output=True,
+            text=True, cwd=Path(__file__).parent
+        )
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+def _case_name(case: dict[str, Any]) -> str:
+    return f'{case["height"]}x{case["width"]}/{case["mines"]}'
+
+
+def compare(old: dict[str, Any], new: dict[str, Any]) -> None:
+    """Print the change of the cases of new against the same cases of old."""
+    before = {_case_name(case): case for case in old['cases']}
+    print(f'{old.get("commit")} -> {new.get("commit")}')
+    for case in new['cases']:
+        name = _case_name(case)
+        if name not in before:
+            print(f'{name:>12}  not in the old results')
+            continue
+        if case['clicks'] != before[name]['clicks']:
+            print(f'{name:>12}  the games differ '
+                  f'({before[name]["clicks"]} -> {case["clicks"]} clicks)')
+        changes = []
+        for phase in PHASES:
+            old_mean = before[name]['latency_ms'][phase].get('mean')
+            new_mean = case['latency_ms'][phase].get('mean')
+            if old_mean and new_mean is not None:
+                changes.append(f'{phase} {new_mean / old_mean:.2f}x')
+        old_memory = before[name]['peak_memory']
+        if old_memory and case['peak_memory'] is not None:
+            changes.append(f'memory {case["peak_memory"] / old_memory:.2f}x')
+        print(f'{name:>12}  {", ".join(changes)}')
+
+
+def parse_budget(text: str) -> float | None:
+    """The budget given on the command line, none for no limit."""
+    return None if text == 'none' else float(text)
+
+
+def main() -> None:
+    parser = ArgumentParser(
+        description='Time the solver on seeded scripted games over a matrix '
+                    'of board sizes and mine ratios.'
+    )
+    parser.add_argument('--sizes', nargs='+', metavar='HxW',
+                        help='board sizes, each played with every ratio '
+                             'instead of the default cases')
+    parser.add_argument('--ratios', nargs='+', type=float,
+                        help='ratios of mines, each played on every size')
+    parser.add_argument('--games', type=int, default=3,
+                        help='games per case (default 3)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--solver', choices=SOLVERS, default=conf.SOLVER)
+    parser.add_argument('--budget', type=parse_budget, default=conf.SOLVE_BUDGET,
+                        help='seconds the solver may spend after a click, '
+                             'none for no limit (default SOLVE_BUDGET of '
+                             'the configuration); without a limit the large '
+                             'cases take minutes and gigabytes')
+    parser.add_argument('--pace', type=Path, metavar='OLD',
+                        help='let the solver get as far as in the JSON '
+                             'results of OLD, so that the games are the '
+                             'same as there whatever the budget and the '
+                             'speed of the machine')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='skip the replays measuring the peak memory')
+    parser.add_argument('--output', type=Path,
+                        help='write the results as JSON to this file')
+    parser.add_argument('--compare', type=Path, metavar='OLD',
+                        help='compare against the JSON results of OLD')
+    args = parser.parse_args()
+    # case name: the progress of its games
+    paces: dict[str, list[list[Progress]]] = {}
+    if args.pace is not None:
+        old = json.loads(args.pace.read_text())
+        if old['seed'] != args.seed:
+            parser.error(f'--pace needs the seed of OLD, {old["seed"]}')
+        paces = {_case_name(case): [[tuple(reached) for reached in game]
+                                    for game in case['progress']]
+                 for case in old['cases'] if case['games'] >= args.games}
+
+    conf.SOLVE_BUDGET = args.budget
+    conf.SOLVER = args.solver
+    cases = CASES
+    if args.sizes or args.ratios:
+        sizes = [tuple(map(int, size.split('x'))) for size in args.sizes] \
+            if args.sizes else SIZES
+        cases = [(height, width, ratio) for height, width in sizes
+                 for ratio in args.ratios or RATIOS + [conf.MINE_RATIO]]
+
+    results: dict[str, Any] = {
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'solver': conf.SOLVER,
+        'workers': conf.SOLVER_WORKERS,
+        'region_cache_bytes': conf.REGION_CACHE_BYTES,
+        'budget': conf.SOLVE_BUDGET,
+        'seed': args.seed,
+        'cases': [],
+    }
+    for height, width, ratio in cases:
+        name = f'{height}x{width}/{round(height * width * ratio)}'
+        if args.pace is not None and name not in paces:
+            parser.error(f'OLD has not {args.games} games of {name}')
+        case = run_case(height, width, ratio, args.games, args.seed,
+                        not args.no_memory, paces.get(name))
+        results['cases'].append(case)
+        click = case['latency_ms']['click']
+        memory = '' if case['peak_memory'] is None else \
+            f', {case["peak_memory"]} bytes'
+        print(f'{_case_name(case):>12}  {case["wins"]}/{case["games"]} won, '
+              f'{case["clicks"]} clicks, click mean {click["mean"]:.2f} ms, '
+              f'max {click["max"]:.2f} ms, '
+              f'{case["peak_configurations"]} configurations{memory}')
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2) + '\n')
+    if args.compare is not None:
+        compare(json.loads(args.compare.read_text()), results)
+
+
+if __name__ == '__main__':
+    main()
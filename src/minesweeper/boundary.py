@@ -0,0 +1,465 @@
+from __future__ import annotations
+from collections.abc import Generator, Iterable, Iterator
+from random import Random
+from typing import TypeAlias, Literal, Any
+
+
+UNTOUCHED: Literal['UNTOUCHED'] = 'UNTOUCHED'
+
+Cell: TypeAlias = tuple[int, int]
+Region: TypeAlias = Cell | Literal['UNTOUCHED']
+
+# Compaction writes every bit of a column as an ASCII digit and adds twice
+# the digits of alive to it, the bytes are then 0x90 + 2 * alive + bit. The
+# table turns the alive ones back into digits, the dead ones get deleted.
+_GATHER = bytes.maketrans(b'\x92\x93', b'01')
+_DEAD = b'\x90\x91'
+# the number of streamed configurations transposed at once
+_CHUNK = 4096
+
+
+# noinspection PyPep8Naming
+class _DO_NOT_SET:
+    pass
+
+
+def add_column(planes: list[int], column: int) -> None:
+    """
+    Increment the bit-sliced counters in planes wherever column has a bit set.
+    The i-th plane holds the i-th bit of the counter of every configuration.
+    """
+    carry = column
+    for i, plane in enumerate(planes):
+        if not carry:
+            return
+        planes[i] = plane ^ carry
+        carry &= plane
+    if carry:
+        planes.append(carry)
+
+
+def less_than(planes: list[int], bound: int, ones: int) -> int:
+    """Return the mask of counters in planes that are smaller than bound."""
+    if bound <= 0:
+        return 0
+    if bound >> len(planes):
+        # bound cannot be represented, every counter is smaller
+        return ones
+    smaller = 0
+    equal = ones
+    for i in reversed(range(len(planes))):
+        if bound >> i & 1:
+            smaller |= equal & ~planes[i]
+            equal &= planes[i]
+        else:
+            equal &= ~planes[i]
+    return smaller
+
+
+def add_counts(first: int, second: int) -> int:
+    """
+    Given two sets of mine counts as bitmaps, return the bitmap of all sums of
+    a count from first and a count from second.
+    """
+    result = 0
+    while second:
+        low = second & -second
+        result |= first << low.bit_length() - 1
+        second ^= low
+    return result
+
+
+def count_set_bits_below(mask: int, position: int) -> int:
+    return (mask & ((1 << position) - 1)).bit_count()
+
+
+def select_bit(mask: int, k: int) -> int:
+    """Return the position of the k-th (from zero) set bit of mask."""
+    low, high = 0, mask.bit_length()
+    # find the smallest position with more than k set bits below it
+    while low < high:
+        middle = (low + high) // 2
+        if count_set_bits_below(mask, middle + 1) > k:
+            high = middle
+        else:
+            low = middle + 1
+    return low
+
+
+class FrontierIndex:
+    """
+    Positions of the boundary cells, shared by many Boundary objects. A cell
+    gets the next free position the first time it is asked for.
+    """
+    __slots__ = ('cells', 'positions')
+
+    def __init__(self, cells: Iterable[Cell] = ()) -> None:
+        self.cells: list[Cell] = []
+        self.positions: dict[Cell, int] = {}
+        for cell in cells:
+            self.position(cell)
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    def position(self, cell: Cell) -> int:
+        if (i := self.positions.get(cell)) is None:
+            i = self.positions[cell] = len(self.cells)
+            self.cells.append(cell)
+        return i
+
+
+class Boundary:
+    """
+    A dict-like object representing a choice of mine placement on the boundary.
+
+    The state is bit-packed, the i-th bit of known tells whether the cell at
+    position i of the frontier index is set and the i-th bit of mines whether
+    it is a mine. Copies share the index.
+    """
+    __slots__ = ('frontier', '_known', '_mines')
+
+    def __init__(self, frontier: FrontierIndex | None = None) -> None:
+        self.frontier = FrontierIndex() if frontier is None else frontier
+        self._known: int = 0
+        self._mines: int = 0
+
+    def __repr__(self) -> str:
+        return str(tuple(cell for cell, mine in self if mine))
+
+    def __len__(self) -> int:
+        return self._known.bit_count()
+
+    def __iter__(self) -> Iterator[tuple[Cell, bool]]:
+        known, mines, cells = self._known, self._mines, self.frontier.cells
+        while known:
+            low = known & -known
+            yield cells[low.bit_length() - 1], bool(mines & low)
+            known ^= low
+
+    def set_mine(self, y: int, x: int) -> None:
+        bit = 1 << self.frontier.position((y, x))
+        self._known |= bit
+        self._mines |= bit
+
+    def set_empty(self, y: int, x: int) -> None:
+        bit = 1 << self.frontier.position((y, x))
+        self._known |= bit
+        self._mines &= ~bit
+
+    def get_number_of_mines(self) -> int:
+        return self._mines.bit_count()
+
+    def copy(self) -> Boundary:
+        new = Boundary(self.frontier)
+        new._known = self._known
+        new._mines = self._mines
+        return new
+
+    def get(self, cell: Cell, default: Any = _DO_NOT_SET) -> Any:
+        i = self.frontier.positions.get(cell)
+        if i is None or not self._known >> i & 1:
+            return None if default is _DO_NOT_SET else default
+        return bool(self._mines >> i & 1)
+
+
+class BoundarySet:
+    """
+    The set of all possible boundaries, stored as a bit matrix.
+
+    The boundary cells are indexed positionally and so are the configurations.
+    Every cell has a column, a single integer whose j-th bit tells whether the
+    j-th configuration has a mine on the cell. The j-th bit of alive is set iff
+    the j-th configuration is possible. Cutting the set to the configurations
+    with a given value on a cell is therefore a single bitwise operation.
+    """
+    def __init__(self) -> None:
+        # the boundary cells in the order of their columns
+        self.cells: list[Cell] = []
+        # the position of each cell in self.cells
+        self.index: dict[Cell, int] = {}
+        self.columns: list[int] = []
+        # bit-sliced number of mines of every configuration
+        self.mines: list[int] = []
+        # the number of configuration slots, some of them may be dead
+        self.size: int = 1
+        # there is exactly one configuration of the empty boundary
+        self.alive: int = 1
+        # k-th item is the bitmap of configurations with k mines, computed
+        # when needed
+        self._classes: list[int] | None = None
+
+    def __repr__(self) -> str:
+        return f'BoundarySet({len(self)} of {self.size}, {self.cells})'
+
+    @classmethod
+    def building(cls, cells: list[Cell], solutions: Iterable[int | None]) \
+            -> Generator[None, None, BoundarySet]:
+        """
+        Build the set from a stream of configurations, each a bitmap whose
+        i-th bit tells whether cells[i] is a mine, yield after every chunk
+        of configurations and return the set. The stream is consumed a
+        chunk at a time, so only the transposed columns are kept. A None in
+        the stream is a pause of its producer, the generator yields on it
+        too.
+        """
+        n = len(cells)
+        # the bits of every column as digits, in the order of configurations
+        parts: list[list[str]] = [[] for _ in cells]
+        size = 0
+
+        def transpose(chunk: list[int]) -> None:
+            # one row of digits per configuration, the columns are then
+            # every n-th digit
+            rows = ''.join([format(config, f'0{n}b') for config in chunk])
+            for i in range(n):
+                parts[i].append(rows[n - 1 - i::n])
+
+        chunk: list[int] = []
+        for config in solutions:
+            if config is not None:
+                chunk.append(config)
+            if len(chunk) == _CHUNK:
+                transpose(chunk)
+                size += len(chunk)
+                chunk = []
+                yield
+            elif config is None:
+                yield
+        transpose(chunk)
+        size += len(chunk)
+
+        boundaries = cls()
+        boundaries.cells = list(cells)
+        boundaries.index = {cell: i for i, cell in enumerate(cells)}
+        boundaries.columns = [int(''.join(digits)[::-1] or '0', 2)
+                              for digits in parts]
+        for column in boundaries.columns:
+            add_column(boundaries.mines, column)
+        boundaries.size = size
+        boundaries.alive = boundaries.ones
+        return boundaries
+
+    @classmethod
+    def union(cls, parts: list[BoundarySet]) -> BoundarySet:
+        """
+        Join sets of configurations of the same cells, which were added in
+        the same order. The slots of the parts are placed one after another.
+        """
+        boundaries = cls()
+        boundaries.cells = list(parts[0].cells)
+        boundaries.index = dict(parts[0].index)
+        boundaries.columns = [0] * len(boundaries.cells)
+        boundaries.size = boundaries.alive = 0
+        for part in parts:
+            offset = boundaries.size
+            for i, column in enumerate(part.columns):
+                boundaries.columns[i] |= column << offset
+            for j, plane in enumerate(part.mines):
+                if j == len(boundaries.mines):
+                    boundaries.mines.append(0)
+                boundaries.mines[j] |= plane << offset
+            boundaries.alive |= part.alive << offset
+            boundaries.size += part.size
+        return boundaries
+
+    def copy(self) -> BoundarySet:
+        """Return a copy that can be cut independently."""
+        return self.relabel({cell: cell for cell in self.cells})
+
+    def relabel(self, cells: dict[Cell, Cell]) -> BoundarySet:
+        """Return a copy with every cell replaced by cells[cell]."""
+        boundaries = BoundarySet()
+        boundaries.cells = [cells[cell] for cell in self.cells]
+        boundaries.index = {cell: i for i, cell in enumerate(boundaries.cells)}
+        boundaries.columns = self.columns.copy()
+        boundaries.mines = self.mines.copy()
+        boundaries.size = self.size
+        boundaries.alive = self.alive
+        return boundaries
+
+    def __len__(self) -> int:
+        return self.alive.bit_count()
+
+    def __bool__(self) -> bool:
+        return bool(self.alive)
+
+    def __contains__(self, cell: Cell) -> bool:
+        return cell in self.index
+
+    @property
+    def ones(self) -> int:
+        return (1 << self.size) - 1
+
+    def mask(self, cell: Cell, mine: bool) -> int:
+        """Return the configurations having (or not having) mine on cell."""
+        if mine:
+            return self.alive & self.columns[self.index[cell]]
+        return self.alive & ~self.columns[self.index[cell]]
+
+    def restrict(self, mask: int) -> None:
+        """Cut the set, keep only the configurations in mask."""
+        self.alive &= mask
+        if self._classes is not None:
+            self._classes = [equal & mask for equal in self._classes]
+
+    def counting(self, cells: Iterable[Cell]) \
+            -> Generator[None, None, list[int]]:
+        """
+        Return bit-sliced numbers of mines on given cells, yield after every
+        cell added.
+        """
+        planes: list[int] = []
+        for cell in cells:
+            add_column(planes, self.columns[self.index[cell]])
+            yield
+        return planes
+
+    def mines_less_than(self, bound: int) -> int:
+        """Return the configurations with less than bound mines."""
+        return less_than(self.mines, bound, self.alive)
+
+    def mines_equal(self, count: int) -> int:
+        """Return the configurations with exactly count mines."""
+        classes = self.mine_classes()
+        return classes[count] if count < len(classes) else 0
+
+    def mine_classes(self) -> list[int]:
+        """
+        Return the list whose k-th item is the bitmap of configurations with k
+        mines. It is computed once and kept until the set is extended.
+        """
+        if self._classes is None:
+            self._classes = []
+            remaining = self.alive
+            while remaining:
+                count = len(self._classes)
+                equal = remaining & ~self.mines_less_than(count) \
+                    & self.mines_less_than(count + 1)
+                self._classes.append(equal)
+                remaining &= ~equal
+        return self._classes
+
+    def mine_counts(self, mask: int | None = None) -> int:
+        """
+        Return the bitmap of numbers of mines that occur among configurations
+        in mask (all alive configurations by default).
+        """
+        counts = 0
+        for count, configurations in enumerate(self.histogram(mask)):
+            if configurations:
+                counts |= 1 << count
+        return counts
+
+    def histogram(self, mask: int | None = None) -> list[int]:
+        """
+        Return the list whose k-th item is the number of configurations in
+        mask (all alive configurations by default) having k mines.
+        """
+        if mask is None:
+            mask = self.alive
+        return [(equal & mask).bit_count() for equal in self.mine_classes()]
+
+    def extending(self, cell: Cell, mine: int, empty: int) \
+            -> Generator[None, None, None]:
+        """
+        Add cell to every configuration. Configurations in mine get a copy
+        with a mine on cell, those in empty keep cell empty. The slots are
+        doubled, the copies are placed in the upper half. The dead slots are
+        dropped when they take most of the set, see compacting. The
+        generator yields after every doubled column.
+        """
+        n = self.size
+        columns = []
+        for column in self.columns + self.mines:
+            columns.append(column | column << n)
+            yield
+        self.columns = columns[:len(self.columns)]
+        self.mines = columns[len(self.columns):]
+        upper = self.ones << n
+        add_column(self.mines, upper)
+        self.index[cell] = len(self.cells)
+        self.cells.append(cell)
+        self.columns.append(upper)
+        self.alive = (empty & self.alive) | (mine & self.alive) << n
+        self.size = 2 * n
+        self._classes = None
+        if 32 * len(self) <= self.size:
+            yield from self.compacting()
+
+    def compacting(self) -> Generator[None, None, None]:
+        """
+        Drop the dead slots, yield after every gathered column. The set is
+        changed only once the generator is exhausted.
+        """
+        size = len(self)
+        if not size:
+            self.columns = [0] * len(self.columns)
+            self.mines = []
+            self.size = 0
+            self._classes = None
+            return
+        selectors = 2 * int.from_bytes(
+            format(self.alive, f'0{self.size}b').encode(), 'big'
+        )
+
+        def gather(value: int) -> int:
+            digits = int.from_bytes(
+                format(value, f'0{self.size}b').encode(), 'big'
+            ) + selectors
+            return int(digits.to_bytes(self.size, 'big').translate(
+                _GATHER, _DEAD
+            ), 2)
+
+        columns = []
+        for column in self.columns:
+            columns.append(gather(column))
+            yield
+        mines = []
+        for plane in self.mines:
+            mines.append(gather(plane))
+            yield
+        self.columns = columns
+        self.mines = mines
+        self.size = size
+        self.alive = self.ones
+        self._classes = None
+
+    def choice(self, mask: int, rng: Random) -> int:
+        """
+        Return a random alive configuration from mask, drawn by rng. The
+        draw depends on the configurations alone, not on the order of the
+        cells or of the slots, so that a region taken from the cache draws
+        as if it was enumerated here. The k-th configuration is found by
+        splitting the mask on the cells in sorted order, the configurations
+        without a mine first.
+        """
+        mask &= self.alive
+        k = rng.randrange(mask.bit_count())
+        for cell in sorted(self.cells):
+            empty = mask & ~self.columns[self.index[cell]]
+            without = empty.bit_count()
+            if k < without:
+                mask = empty
+            else:
+                mask &= ~empty
+                k -= without
+            if mask & mask - 1 == 0:
+                return mask.bit_length() - 1
+        # the same configuration in more slots
+        return select_bit(mask, k)
+
+    def items(self, config: int) -> Iterator[tuple[Cell, bool]]:
+        for cell, column in zip(self.cells, self.columns):
+            yield cell, bool(column >> config & 1)
+
+    def get(self, config: int, frontier: FrontierIndex | None = None) \
+            -> Boundary:
+        """Materialize a single configuration."""
+        boundary = Boundary(frontier)
+        for (y, x), mine in self.items(config):
+            if mine:
+                boundary.set_mine(y, x)
+            else:
+                boundary.set_empty(y, x)
+        return boundary
@@ -11,6 +11,38 @@ LEFT_RELEASED = curses.BUTTON1_RELEASED
 MINE_RATIO = 45/160
 # 33 / 160  # the exact ratio in the original on expert difficulty
 
+# the engine deciding which cells are safe, one of solver.SOLVERS:
+#   'enumeration'   all configurations of the boundary, bit matrix
+#   'backtracking'  the same, enumerated depth-first with less memory
+SOLVER = 'enumeration'
+# the processes enumerating the independent regions of the boundary, 1 to
+# enumerate them in the solving thread itself
+SOLVER_WORKERS = 1
+# the memory for the enumerated regions kept for when their number pattern
+# comes again, 0 to keep none
+REGION_CACHE_BYTES = 64 * 2**20
+# the seconds the solver may spend after a click, None for no limit. When
+# it runs out, only the cells proven so far are safe and the solving goes on
+# while the player thinks.
+SOLVE_BUDGET = 0.2
+# solve in a background thread, so that the uncovered cells are drawn at
+# once. The events on the minefield wait until the solver is done, the bar
+# shows an hourglass meanwhile.
+SOLVE_IN_BACKGROUND = True
+# the milliseconds between checks whether the solver is done
+POLL_INTERVAL = 20
+# the file the measurements of every action are appended to as JSON lines,
+# see tracing.Tracer, None not to measure
+TRACE_FILE = None
+# show the time and the configurations of the last action in the bar
+TRACE_BAR = False
+# the file the input of the game is logged to, {seed} is replaced by the
+# seed of the game, None not to log. Replay a log by main.py --replay.
+EVENT_LOG = None
+# the file a game in progress is saved to when quit by Ctrl+C, None not to
+# save. Resume it by main.py --resume.
+SAVE_FILE = None
+
 # components are in range [0, 1000]
 RGB_BGC = (500, 500, 500)
 RGB_BGU = (800, 800, 800)
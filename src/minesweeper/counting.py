@@ -0,0 +1,184 @@
+from __future__ import annotations
+from fractions import Fraction
+from math import comb
+from random import Random
+
+from boundary import UNTOUCHED, Cell, Region, Boundary, BoundarySet, \
+    FrontierIndex
+
+
+def convolve(first: list[int], second: list[int]) -> list[int]:
+    """
+    Given the numbers of configurations with k mines of two independent
+    regions, return the numbers for the regions together.
+    """
+    result = [0] * (len(first) + len(second) - 1)
+    for i, a in enumerate(first):
+        if a:
+            for j, b in enumerate(second):
+                result[i + j] += a * b
+    return result
+
+
+def ways(cells: int, mines: int) -> int:
+    """The number of ways to place mines on cells."""
+    if 0 <= mines <= cells:
+        return comb(cells, mines)
+    return 0
+
+
+def weighted_choice(weights: list[int], rng: Random) -> int:
+    """Return an index with probability proportional to its weight."""
+    r = rng.randrange(sum(weights))
+    for i, weight in enumerate(weights):
+        if r < weight:
+            return i
+        r -= weight
+    raise ValueError('weights must not all be zero')
+
+
+class Counts:
+    """
+    The numbers of complete minefields consistent with the uncovered cells.
+
+    A configuration of the boundary with n mines can be completed in
+    comb(untouched, total_mines - n) ways, the components are independent and
+    the known mines are shared by all configurations. The numbers are exact,
+    a cell can be a mine iff the number of minefields with a mine on it is
+    nonzero.
+    """
+    def __init__(self, components: list[BoundarySet], known_mines: set[Cell],
+                 known_safe: set[Cell], untouched: int, total_mines: int) \
+            -> None:
+        self.components = components
+        self.known_mines = known_mines
+        self.known_safe = known_safe
+        self.untouched = untouched
+        self.total_mines = total_mines
+        # the positions of all boundary cells, shared by the drawn boundaries
+        self.frontier = FrontierIndex(known_mines)
+        for cell in known_safe:
+            self.frontier.position(cell)
+        for boundaries in components:
+            for cell in boundaries.cells:
+                self.frontier.position(cell)
+        # the k-th item is the number of configurations with k mines
+        self.histograms: list[list[int]] = [
+            boundaries.histogram() for boundaries in components
+        ]
+        # the number of complete minefields
+        self.total: int = 0
+        # cell: the number of complete minefields having a mine on cell
+        self.mines: dict[Cell, int] = {}
+        # the number of complete minefields having a mine on a particular
+        # untouched cell, resp. having it empty
+        self.untouched_mines: int = 0
+        self.untouched_empty: int = 0
+
+        # prefix[i] and suffix[i] are histograms of the components before
+        # and after i-th one
+        prefix = [[0] * len(known_mines) + [1]]
+        for histogram in self.histograms:
+            prefix.append(convolve(prefix[-1], histogram))
+        suffix = [[1]]
+        for histogram in reversed(self.histograms):
+            suffix.append(convolve(suffix[-1], histogram))
+        suffix.reverse()
+
+        for n, configurations in enumerate(prefix[-1]):
+            self.total += configurations * ways(untouched, total_mines - n)
+            self.untouched_mines += configurations * ways(
+                untouched - 1, total_mines - n - 1
+            )
+            self.untouched_empty += configurations * ways(
+                untouched - 1, total_mines - n
+            )
+
+        for i, boundaries in enumerate(components):
+            # the number of completions of a configuration of i-th component
+            # with k mines
+            others = convolve(prefix[i], suffix[i + 1])
+            completions = [
+                sum(c * ways(untouched, total_mines - k - s)
+                    for s, c in enumerate(others))
+                for k in range(len(self.histograms[i]))
+            ]
+            for cell in boundaries.cells:
+                histogram = boundaries.histogram(boundaries.mask(cell, True))
+                self.mines[cell] = sum(c * completions[k]
+                                       for k, c in enumerate(histogram))
+        for cell in known_mines:
+            self.mines[cell] = self.total
+        for cell in known_safe:
+            self.mines[cell] = 0
+
+    def can_be_mine(self, pos: Region) -> bool:
+        """Is there a complete minefield with a mine in pos?"""
+        if pos == UNTOUCHED:
+            return self.untouched_mines > 0
+        return self.mines[pos] > 0
+
+    def can_be_empty(self, pos: Region) -> bool:
+        """Is there a complete minefield with pos empty?"""
+        if pos == UNTOUCHED:
+            return self.untouched_empty > 0
+        return self.mines[pos] < self.total
+
+    def probability(self, pos: Region) -> Fraction:
+        """The probability that a cell in pos is a mine."""
+        if pos == UNTOUCHED:
+            return Fraction(self.untouched_mines, self.total)
+        return Fraction(self.mines[pos], self.total)
+
+    def draw(self, rng: Random, pos: Region | None = None,
+             mine: bool = True) -> Boundary:
+        """
+        Choose a random configuration of the boundary by rng, each with
+        probability proportional to the number of its completions. When pos
+        is given, the configuration has (or has not) a mine on it. For
+        UNTOUCHED, the completions have (or have not) a mine on a particular
+        untouched cell.
+        """
+        masks = [boundaries.alive for boundaries in self.components]
+        histograms = self.histograms.copy()
+        for i, boundaries in enumerate(self.components):
+            if pos in boundaries:
+                masks[i] = boundaries.mask(pos, mine)
+                histograms[i] = boundaries.histogram(masks[i])
+
+        untouched, remaining = self.untouched, self.total_mines
+        if pos == UNTOUCHED:
+            # the particular untouched cell is decided
+            untouched -= 1
+            remaining -= mine
+
+        suffix = [[0] * len(self.known_mines) + [1]]
+        for histogram in reversed(histograms):
+            suffix.append(convolve(suffix[-1], histogram))
+        suffix.reverse()
+
+        # choose the number of mines on the boundary, then split it among
+        # the components
+        n = weighted_choice([configurations * ways(untouched, remaining - n)
+                             for n, configurations in enumerate(suffix[0])],
+                            rng)
+        boundary = Boundary(self.frontier)
+        for y, x in self.known_mines:
+            boundary.set_mine(y, x)
+        for y, x in self.known_safe:
+            boundary.set_empty(y, x)
+        for i, boundaries in enumerate(self.components):
+            k = weighted_choice([
+                c * (suffix[i + 1][n - k] if 0 <= n - k < len(suffix[i + 1])
+                     else 0)
+                for k, c in enumerate(histograms[i])
+            ], rng)
+            n -= k
+            config = boundaries.choice(masks[i] & boundaries.mines_equal(k),
+                                       rng)
+            for (y, x), cell_mine in boundaries.items(config):
+                if cell_mine:
+                    boundary.set_mine(y, x)
+                else:
+                    boundary.set_empty(y, x)
+        return boundary
@@ -0,0 +1,92 @@
+from __future__ import annotations
+from collections import deque
+from pathlib import Path
+from struct import Struct
+
+from solver import Progress
+
+
+# magic, version, seed of the game, height and width of the screen
+_HEADER = Struct('<4sBQHH')
+# key, then the mouse event (id, x, y, z, bstate), zeros for other keys
+_RECORD = Struct('<ihiiiQ')
+_MAGIC = b'FMEL'
+_VERSION = 2
+# the key of a record holding the progress of the solver instead, the
+# parts finished in x and the steps into the next one in bstate
+_PROGRESS = -2
+
+MouseEvent = tuple[int, int, int, int, int]
+
+
+class EventLog:
+    """
+    The input of a game, appended to a binary file as it comes.
+
+    The file starts with the seed of the game and the size of the screen,
+    then holds a record for every key that getch returned, with the mouse
+    event for KEY_MOUSE, and for ERR when it started a refinement. The
+    records of the progress of the solver are in between, in the order of
+    the work they belong to (see BoundarySolver.reached), as the budget
+    stops the solver by the clock. Together they replay the game, see
+    EventReplay. Every record is flushed, so the log of a game that crashed
+    or hung is complete.
+    """
+    def __init__(self, path: str | Path, seed: int,
+                 size: tuple[int, int]) -> None:
+        self.file = open(path, 'wb')
+        self.file.write(_HEADER.pack(_MAGIC, _VERSION, seed, *size))
+        self.file.flush()
+
+    def write(self, key: int, mouse: MouseEvent = (0, 0, 0, 0, 0)) -> None:
+        self.file.write(_RECORD.pack(key, *mouse))
+        self.file.flush()
+
+    def write_progress(self, progress: Progress) -> None:
+        done, steps = progress
+        self.write(_PROGRESS, (0, done, 0, 0, steps))
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class EventReplay:
+    """
+    The input of a game read back from an EventLog, in place of getch and
+    curses.getmouse, and the progress of the solver in place of its clock,
+    see BoundarySolver.pace. Both raise EOFError when the log is over.
+    """
+    def __init__(self, path: str | Path) -> None:
+        data = Path(path).read_bytes()
+        magic, version, self.seed, *size = _HEADER.unpack_from(data)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f'{path} is not an event log of version '
+                             f'{_VERSION}')
+        self.size: tuple[int, int] = (size[0], size[1])
+        self._records: deque[tuple[int, MouseEvent]] = deque()
+        self._progress: deque[Progress] = deque()
+        for key, *mouse in _RECORD.iter_unpack(
+            data[_HEADER.size:len(data) - (len(data) - _HEADER.size) %
+                 _RECORD.size]
+        ):
+            if key == _PROGRESS:
+                self._progress.append((mouse[1], mouse[4]))
+            else:
+                self._records.append(
+                    (key, tuple(mouse))  # type: ignore[arg-type]
+                )
+        self._mouse: MouseEvent = (0, 0, 0, 0, 0)
+
+    def getch(self) -> int:
+        if not self._records:
+            raise EOFError('the event log is over')
+        key, self._mouse = self._records.popleft()
+        return key
+
+    def pace(self) -> Progress:
+        if not self._progress:
+            raise EOFError('the event log is over')
+        return self._progress.popleft()
+
+    def getmouse(self) -> MouseEvent:
+        return self._mouse
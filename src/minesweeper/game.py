@@ -0,0 +1,562 @@
+from __future__ import annotations
+from itertools import product
+from random import Random
+from time import perf_counter
+from typing import Literal, TypeAlias
+
+import configuration as conf
+from boundary import UNTOUCHED, Cell, Region, Boundary
+from propagation import Constraint
+from floodfill import flood_fill
+from memo import get_region_cache
+from solver import BoundarySolver, make_solver
+from topology import Topology, get_topology
+from tracing import Tracer
+from worker import SolverWorker
+
+
+# (kind, y, x, argument), what has to be redrawn after an action:
+#   'uncover'    (y, x) uncovered, argument is its number
+#   'span'       the zeros from (y, x) to (y, argument) uncovered
+#   'flag'       (y, x) flagged
+#   'unflag'     the flag removed from (y, x)
+#   'mine'       a mine revealed after the explosion
+#   'explosion'  the mine (y, x) the player uncovered
+#   'mistake'    a flag on (y, x) that was not a mine
+#   'hint'       a cell that could have been safely uncovered
+Event: TypeAlias = tuple[str, int, int, int]
+
+
+def is_mine(number: int) -> bool:
+    return number in (10, 12)
+
+
+def is_pressable(number: int) -> bool:
+    return number in (11, 12)
+
+
+def is_covered(number: int) -> bool:
+    return number > 8
+
+
+def is_unflagged_mine(number: int) -> bool:
+    return number == 12
+
+
+def is_flagged(number: int) -> bool:
+    return number in (9, 10)
+
+
+class GameCore:
+    """
+    The game mechanics without a screen.
+
+    The player acts through uncover, flag and chord, given cell coordinates.
+    Every change of a cell is appended to events, which a front end (the
+    curses Minefield) takes and draws, or ignores. Mines are placed by a
+    random generator seeded by seed, the first clicks are not special: the
+    rules of fair guessing move the mines instead.
+
+    Given a tracer, every action is measured: the cells it uncovered and
+    how long that took (new, old, search_ms), the measurements of the
+    solver (see BoundarySolver.stats) and the state afterwards (state,
+    covered, frontier, approximate).
+    """
+    def __init__(self, height: int, width: int, total_mines: int,
+                 seed: int | None = None, background: bool = False,
+                 tracer: Tracer | None = None) -> None:
+        # the dimensions of the minefield
+        self.dimensions: tuple[int, int] = (height, width)
+        self.width = width
+        # the neighbour tables of the board
+        self.topology: Topology = get_topology(height, width)
+        # the current number of cells unexposed to the player
+        self.covered: int = height * width
+        # the total number of mines, costant
+        self.total_mines = total_mines
+        # the total number of mines minus the number of flags placed
+        self.unmarked_mines: int = total_mines
+        # the state of the minefield, cell (y, x) at index y * width + x:
+        #   {0, ..., 8}           uncovered numbers, constant
+        #   9                     flagged cell that is not mine
+        #   10                    flagged mine
+        #   11                    covered cell that is not mine
+        #   12                    mine, can be repositioned, is always covered
+        self.minefield: bytearray
+        # the number of mines among the neighbours of each cell, indexed the
+        # same way. Kept up to date whenever the mines are moved.
+        self.neighbour_mines = bytearray(self.covered)
+        # the set of cells that are flagged
+        self.flags: set[Cell] = set()
+        # 0: game not started; 1: playing; 2: EXPLOSION!; 3: player won
+        self.game_state: Literal[0, 1, 2, 3] = 0
+        # the changes not taken by the front end yet
+        self.events: list[Event] = []
+        # the seed of the game, a random one unless given. The game, the
+        # solver draws included, replays from it given the same actions.
+        self.seed: int = seed if seed is not None else \
+            Random().getrandbits(64)
+        # the source of every random decision of the game
+        self.random = Random(self.seed)
+        # the measurements of the actions, None not to measure them
+        self.tracer = tracer
+
+        # helper variables:
+        # the set of cells in the UNTOUCHED region that are mine
+        self.mine_cells: set[Cell]
+        # the set of cells in the UNTOUCHED region that are not mine
+        self.empty_cells: set[Cell]
+        # the set of all regions that player can safely uncover
+        self.possible: set[Region] = set()
+        # keys are a set of all cells on the boundary, each cell has associated
+        # the index of the direction to the uncovered cell it was accessed from
+        self.normal_directions: dict[Cell, int] = dict()
+        # what is known about the covered cells, see BoundarySolver
+        self.solver: BoundarySolver
+        # runs the solver updates, possible is stale while it is busy
+        self.worker = SolverWorker(background)
+        # is the job of the worker a refinement? see refine
+        self._refining: bool = False
+
+        all_coordinates: list[Cell] = list(product(range(height),
+                                                   range(width)))
+        self.mine_cells = set(self.random.sample(all_coordinates,
+                                                 k=total_mines))
+        self.empty_cells = set(all_coordinates) - self.mine_cells
+        self.minefield = bytearray(
+            12 if cell in self.mine_cells else 11 for cell in all_coordinates
+        )
+        for y, x in self.mine_cells:
+            self._add_to_counts(y, x, 1)
+
+        self.solver = make_solver(
+            conf.SOLVER, total_mines, conf.SOLVE_BUDGET, conf.SOLVER_WORKERS,
+            get_region_cache(conf.REGION_CACHE_BYTES)
+            if conf.REGION_CACHE_BYTES else None, self.random
+        )
+        self.solver.update([], self.covered)
+        # nothing limits the update of a board without numbers, it is not
+        # replayed
+        self.solver.reached.clear()
+
+    def take_events(self) -> list[Event]:
+        """Return the events since the last call and forget them."""
+        events, self.events = self.events, []
+        return events
+
+    def uncover(self, y: int, x: int) -> None:
+        """Uncover a covered cell that is not flagged."""
+        if self.game_state > 1 or not is_pressable(
+                self.minefield[y * self.width + x]):
+            return
+        self.game_state = 1
+        if self.tracer is not None:
+            self.tracer.begin('uncover', y, x)
+        self._uncover(y, x)
+        self._finish_trace()
+
+    def flag(self, y: int, x: int) -> None:
+        """Flag a covered cell, or remove its flag."""
+        i = y * self.width + x
+        if self.game_state > 1 or not is_covered(self.minefield[i]):
+            return
+        if self.tracer is not None:
+            self.tracer.begin('flag', y, x)
+        if is_pressable(self.minefield[i]):
+            self.flags.add((y, x))
+            self.minefield[i] -= 2
+            self.unmarked_mines -= 1
+            self.events.append(('flag', y, x, 0))
+        else:
+            self.flags.remove((y, x))
+            self.minefield[i] += 2
+            self.unmarked_mines += 1
+            self.events.append(('unflag', y, x, 0))
+        self._finish_trace()
+
+    def chord_cells(self, y: int, x: int) -> tuple[list[Cell], bool]:
+        """
+        Return the covered unflagged neighbours of the uncovered (y, x) and
+        whether it has enough flags around to uncover them.
+        """
+        flags = 0
+        cells = []
+        for ny, nx in self.topology.around[y][x]:
+            if is_flagged(self.minefield[ny * self.width + nx]):
+                flags += 1
+            elif is_pressable(self.minefield[ny * self.width + nx]):
+                cells.append((ny, nx))
+        return cells, bool(cells) and flags >= self.minefield[
+            y * self.width + x
+        ]
+
+    def chord(self, y: int, x: int) -> None:
+        """Uncover the neighbours of (y, x) if it has enough flags around."""
+        if self.game_state > 1 or is_covered(
+                self.minefield[y * self.width + x]):
+            return
+        cells, chordable = self.chord_cells(y, x)
+        if chordable:
+            if self.tracer is not None:
+                self.tracer.begin('chord', y, x)
+            self._uncover_several(cells)
+            self._finish_trace()
+
+    def region(self, y: int, x: int) -> Region:
+        """The region the covered (y, x) belongs to."""
+        return (y, x) if (y, x) in self.normal_directions else UNTOUCHED
+
+    def _uncover(self, y: int, x: int) -> None:
+        """Handle left-click on (y, x)."""
+        pos: Region
+        if (y, x) in self.normal_directions:
+            pos = (y, x)
+        else:
+            self._remove_from_untouched(y, x)
+            pos = UNTOUCHED
+        if pos in self.possible:
+            self._uncover_safe(y, x)
+
+        elif not self.region_can_be_empty(pos):
+            self._explode(y, x)
+
+        elif self.possible:
+            if not is_mine(self.minefield[y * self.width + x]):
+                if pos == UNTOUCHED:
+                    moved = self._overwrite_minefield(
+                        self.solver.draw(UNTOUCHED, True), (y, x), True
+                    )
+                else:
+                    # pos is not in possible, so the solver has a possible
+                    # boundary with a mine on it (unless it is approximate)
+                    moved = self._overwrite_minefield(
+                        self.solver.draw(pos, True)
+                    )
+                if not moved:
+                    # no such minefield found in time, the guess stands
+                    self._uncover_safe(y, x)
+                    return
+            self._explode(y, x)
+
+        else:
+            if (is_mine(self.minefield[y * self.width + x]) and
+                    not self._overwrite_minefield(
+                        self.solver.draw(pos, False), (y, x), False
+                    )):
+                self._explode(y, x)
+                return
+            self._uncover_safe(y, x)
+
+    def _remove_from_untouched(self, y: int, x: int) -> None:
+        """Remove (y, x) from mine_cells or empty_cells."""
+        if (y, x) in self.empty_cells:
+            self.empty_cells.remove((y, x))
+        elif (y, x) in self.mine_cells:
+            self.mine_cells.remove((y, x))
+
+    def _uncover_safe(self, y: int, x: int) -> None:
+        """Uncover (y, x) when known that it is empty."""
+        self._uncover_search((y, x))
+        self._update_state()
+
+    def _uncover_search(self, *cells: Cell) -> tuple[list[Cell], list[Cell],
+                                                     list[Cell]]:
+        """
+        Uncover each cell in cells. If some is zero, flood-fill the whole
+        opening. Return the list of new cells on the boundary, the list of
+        cells removed from the boundary and the list of new cells on the inner
+        boundary. These impose further restrictions on the possible boundaries.
+        """
+        # each cell in cells must be pressable
+
+        start = perf_counter()
+        new: list[Cell] = []
+        old: list[Cell] = []
+        opening = flood_fill(self.minefield, self.neighbour_mines,
+                             self.topology,
+                             [y * self.width + x for y, x in cells])
+
+        # the zeros are reported a row span at a time
+        for y, left, right in opening.spans:
+            for x in range(left, right + 1):
+                if self._uncover_cell(y, x, 0, report=False):
+                    old.append((y, x))
+            self.events.append(('span', y, left, right))
+        numbers = [self.topology.cell(i) for i in opening.numbers]
+        for y, x in numbers:
+            if self._uncover_cell(y, x):
+                old.append((y, x))
+
+        # flagged cells next to a zero cannot be uncovered, they are on the
+        # boundary with the zero on the inner boundary
+        inner_boundary: list[Cell] = []
+        for i, zero in opening.flagged.items():
+            inner_boundary.append(self.topology.cell(zero))
+            if (cell := self.topology.cell(i)) not in self.normal_directions:
+                self._add_to_boundary(cell, self.topology.cell(zero))
+                new.append(cell)
+        # the covered neighbours of the numbers
+        for y, x in numbers:
+            for ny, nx in self.topology.around[y][x]:
+                if (is_covered(self.minefield[ny * self.width + nx]) and
+                        (ny, nx) not in self.normal_directions):
+                    self._add_to_boundary((ny, nx), (y, x))
+                    new.append((ny, nx))
+
+        if self.covered == self.total_mines:
+            self.game_state = 3
+        if self.tracer is not None:
+            self.tracer.note(
+                search_ms=round((perf_counter() - start) * 1000, 3),
+                new=len(new), old=len(old)
+            )
+        return new, old, inner_boundary + numbers
+
+    def _add_to_boundary(self, cell: Cell, uncovered: Cell) -> None:
+        """Move cell from UNTOUCHED to the boundary next to uncovered."""
+        self._remove_from_untouched(*cell)
+        self.normal_directions[cell] = \
+            self.topology.direction(cell, uncovered) - 8
+
+    def _update_state(self) -> None:
+        """
+        Feed the uncovered cells to the solver and update the regions that
+        can be safely uncovered, once the worker is done (see poll).
+        """
+        constraints = self._collect_constraints()
+        untouched = self.covered - len(self.normal_directions)
+        self.worker.submit(lambda: self.solver.update(constraints, untouched))
+        self.poll()
+
+    @property
+    def busy(self) -> bool:
+        """Is the solver being updated? No actions may be taken then."""
+        return self.worker.busy
+
+    @property
+    def refinable(self) -> bool:
+        """Has the solver work left to do while the game goes on?"""
+        return self.game_state == 1 and self.solver.approximate
+
+    def poll(self, timeout: float | None = 0) -> bool:
+        """
+        Publish the update of the worker if it has finished within timeout
+        seconds. Return True if it has.
+        """
+        if not self.worker.poll(timeout):
+            return False
+        refining, self._refining = self._refining, False
+        if refining and self.solver.approximate:
+            # nothing to publish, it goes on the next time the player is idle
+            if self.tracer is not None:
+                self.tracer.cancel()
+            return True
+        self._update_possible()
+        if self.tracer is not None:
+            self.tracer.note(**self.solver.stats)
+            self._finish_trace()
+        return True
+
+    def refine(self) -> bool:
+        """
+        Let an approximate solver go on while the player is idle. It runs in
+        the worker like an update, see poll. Return True if it has started.
+        """
+        if self.busy or not self.refinable:
+            return False
+        if self.tracer is not None:
+            self.tracer.begin('refine')
+        self._refining = True
+        self.worker.submit(lambda: self.solver.refine(conf.SOLVE_BUDGET))
+        self.poll()
+        return True
+
+    def _finish_trace(self) -> None:
+        """Write the measurements of the action once the solver is done."""
+        if self.tracer is not None and not self.busy:
+            self.tracer.note(state=self.game_state, covered=self.covered,
+                             frontier=len(self.normal_directions),
+                             approximate=self.solver.approximate)
+            self.tracer.end()
+
+    def _update_possible(self) -> None:
+        """Update the regions that can be safely uncovered."""
+        if (len(self.normal_directions) < self.covered and
+                not self.region_can_be_mine(UNTOUCHED)):
+            self.possible.add(UNTOUCHED)
+        elif UNTOUCHED in self.possible:
+            self.possible.remove(UNTOUCHED)
+        self.possible.update(self.solver.safe_cells())
+
+    def _collect_constraints(self) -> list[Constraint]:
+        """
+        Return the values of the uncovered cells on the inner boundary
+        together with their covered neighbours.
+        """
+        constraints: dict[Cell, list[Cell]] = {}
+        for y, x in self.normal_directions:
+            for ny, nx in self.topology.around[y][x]:
+                if not is_covered(self.minefield[ny * self.width + nx]):
+                    constraints.setdefault((ny, nx), []).append((y, x))
+        return [(self.minefield[y * self.width + x], cells)
+                for (y, x), cells in constraints.items()]
+
+    def region_can_be_mine(self, pos: Region) -> bool:
+        """Is there a possible boundary with a mine in pos?"""
+        return self.solver.can_be_mine(pos)
+
+    def region_can_be_empty(self, pos: Region) -> bool:
+        """Is there a possible boundary with pos not full of mines?"""
+        return self.solver.can_be_empty(pos)
+
+    def _count_mines(self, y: int, x: int) -> int:
+        """Count the number of mines among the neighbours of (y, x)."""
+        return self.neighbour_mines[y * self.width + x]
+
+    def _add_to_counts(self, y: int, x: int, change: int) -> None:
+        """Add change to the mine counts of the neighbours of (y, x)."""
+        topology = self.topology
+        i = y * self.width + x
+        for j in topology.neighbours[topology.offsets[i]:
+                                     topology.offsets[i + 1]]:
+            self.neighbour_mines[j] += change
+
+    def _uncover_cell(self, y: int, x: int, mines: int | None = None,
+                      report: bool = True) -> bool:
+        """
+        Update minefield, report the cell (unless the caller reports it in
+        bulk), remove it from datastructures. Return True if the cell was on
+        the boundary, False otherwise.
+        """
+        if mines is None:
+            mines = self._count_mines(y, x)
+
+        if report:
+            self.events.append(('uncover', y, x, mines))
+
+        # remove it from datastructures containing covered cells
+        self.covered -= 1
+        self._remove_from_untouched(y, x)
+        if (y, x) in self.possible:
+            self.possible.remove((y, x))
+        self.minefield[y * self.width + x] = mines
+        if (y, x) in self.normal_directions:
+            # The cell is on the boundary
+            del self.normal_directions[(y, x)]
+            self.solver.discard((y, x))
+            return True
+        return False
+
+    def _explode(self, y: int, x: int) -> None:
+        """Uncover a cell (y, x) containing mine, report, update game state."""
+        # the sets are gone through in order, their own order depends on
+        # their history, which a resumed game does not share (see savegame)
+        for fy, fx in sorted(self.flags):
+            if not is_mine(self.minefield[fy * self.width + fx]):
+                self.events.append(('mistake', fy, fx, 0))
+        for my, mx in sorted(self.mine_cells):
+            if is_pressable(self.minefield[my * self.width + mx]):
+                self.events.append(('mine', my, mx, 0))
+        for my, mx in self.normal_directions:
+            if is_unflagged_mine(self.minefield[my * self.width + mx]):
+                self.events.append(('mine', my, mx, 0))
+        self.events.append(('explosion', y, x, 0))
+        if self.possible:
+            pos = min(self.possible, key=str)
+            if pos == UNTOUCHED:
+                pos = min(self.empty_cells)
+            self.events.append(('hint', *pos, 0))
+        self.game_state = 2
+
+    def _overwrite_minefield(
+            self, boundary: Boundary | None, fixcell: Cell | None = None,
+            fixmine: bool = False
+    ) -> bool:
+        """
+        Write boundary into minefield, placing untouched mines randomly.
+        When untouched fixcell given, fix it either to be or not to be mine.
+        Return False and keep the minefield when there is no boundary or the
+        untouched cells cannot make up for the change in the number of mines.
+        """
+        # fixcell doesn't have to be moved from mine_cells to empty_cells or
+        # vice versa, because it will be uncovered immediately afterwards
+        if boundary is None:
+            return False
+        changes: dict[Cell, bool] = dict(boundary)
+        if fixcell:
+            changes[fixcell] = fixmine
+        change: int = sum(
+            is_mine(self.minefield[y * self.width + x]) - mine
+            for (y, x), mine in changes.items()
+        )
+        if (change > len(self.empty_cells) - (fixcell in self.empty_cells) or
+                -change > len(self.mine_cells) - (fixcell in self.mine_cells)):
+            return False
+
+        for (y, x), mine in changes.items():
+            if mine and not is_mine(self.minefield[y * self.width + x]):
+                self.minefield[y * self.width + x] += 1
+                self._add_to_counts(y, x, 1)
+            elif not mine and is_mine(self.minefield[y * self.width + x]):
+                self.minefield[y * self.width + x] -= 1
+                self._add_to_counts(y, x, -1)
+
+        if change > 0:
+            for y, x in self._sample_except(self.empty_cells, change,
+                                            fixcell):
+                self.minefield[y * self.width + x] += 1
+                self._add_to_counts(y, x, 1)
+                self.empty_cells.remove((y, x))
+                self.mine_cells.add((y, x))
+        elif change < 0:
+            for y, x in self._sample_except(self.mine_cells, -change,
+                                            fixcell):
+                self.minefield[y * self.width + x] -= 1
+                self._add_to_counts(y, x, -1)
+                self.mine_cells.remove((y, x))
+                self.empty_cells.add((y, x))
+        return True
+
+    def _sample_except(self, cells: set[Cell], k: int,
+                       excluded: Cell | None) -> list[Cell]:
+        """Choose k random cells from cells, never the excluded one."""
+        # one extra cell is drawn instead of building cells - {excluded};
+        # sorted, so that the draw does not depend on the order of the set
+        chosen = self.random.sample(sorted(cells), k=min(k + 1, len(cells)))
+        return [cell for cell in chosen if cell != excluded][:k]
+
+    def _uncover_several(self, cells: list[Cell]) -> None:
+        """Handle right-click on an uncovered cell with enough flags."""
+        if len(cells) == 1:
+            self._uncover(*cells[0])
+        elif self.possible.issuperset(cells):
+            self._uncover_several_safe(cells)
+        elif self.possible.issubset(cells):
+            self._uncover_several_as_placed(cells)
+        else:
+            for cell in cells:
+                if cell not in self.possible:
+                    explosive_cell = cell
+            # noinspection PyUnboundLocalVariable
+            if self._overwrite_minefield(
+                self.solver.draw(explosive_cell, True)
+            ):
+                self._explode(*explosive_cell)
+            else:
+                # no such minefield found in time, the guess stands
+                self._uncover_several_as_placed(cells)
+
+    def _uncover_several_as_placed(self, cells: list[Cell]) -> None:
+        """Uncover cells on the boundary, exploding on a placed mine."""
+        for y, x in cells:
+            if is_mine(self.minefield[y * self.width + x]):
+                self._explode(y, x)
+                return
+        self._uncover_several_safe(cells)
+
+    def _uncover_several_safe(self, cells: list[Cell]) -> None:
+        """
+        Uncover each given cell on the boundary when known that it is empty.
+        """
+        self._uncover_search(*cells)
+        self._update_state()
@@ -1,16 +1,22 @@
 import curses
 import curses.ascii
+from argparse import ArgumentParser
+from collections import deque
 
 from minefield import Minefield
 from bar import Bar
 from configuration import UNCOVER_PRESSED, UNCOVER_RELEASED, MARK_PRESSED, \
-    MARK_RELEASED, init_colors, PAIR_BORDER, LEFT_PRESSED, LEFT_RELEASED
+    MARK_RELEASED, init_colors, PAIR_BORDER, LEFT_PRESSED, LEFT_RELEASED, \
+    POLL_INTERVAL, TRACE_BAR, EVENT_LOG, SAVE_FILE
+from eventlog import EventLog, EventReplay, MouseEvent
+from savegame import save
 from MyLib.ocurses.curses_utilities import border, addstr
 
 
 class FairMinesweeper:
     """The application object managing mainloop."""
-    def __init__(self, stdscr: curses.window) -> None:
+    def __init__(self, stdscr: curses.window, seed: int | None = None,
+                 replaying: bool = False, resume: str | None = None) -> None:
         # This is mandatory to initialize curses, but it is undocumented
         stdscr.refresh()
         # Define colors and color pairs
@@ -26,11 +32,21 @@ class FairMinesweeper:
         # noinspection PyTypeChecker
         self.minefield = Minefield(curses.newwin(
             winy - 4, winx - 2, offsety + 3, offsetx + 1
-        ))
+        ), seed, False if replaying else None, resume)
         # noinspection PyTypeChecker
         self.bar = Bar(curses.newwin(
             1, winx - 2, offsety + 1, offsetx + 1
         ))
+        # the mouse events (y, x, bstate) on the minefield waiting for the
+        # solver to finish
+        self.queued: deque[tuple[int, int, int]] = deque()
+        # the log of the input, see getch and getmouse
+        self.log: EventLog | None = None
+        # a resumed game does not replay from its seed, it is not logged
+        if EVENT_LOG and not replaying and resume is None:
+            seed = self.minefield.core.seed
+            self.log = EventLog(EVENT_LOG.format(seed=seed), seed,
+                                stdscr.getmaxyx())
 
         # start receiving mouse events
         curses.mousemask(-1)
@@ -59,20 +75,29 @@ class FairMinesweeper:
     def mainloop(self) -> None:
         while True:
             curses.doupdate()
+            # while the solver is busy, check for it regularly; while it is
+            # approximate in a running game, the worker refines it whenever
+            # no event waits; otherwise wait for the next event
+            if self.minefield.core.busy:
+                self.stdscr.timeout(POLL_INTERVAL)
+            elif self.minefield.core.refinable:
+                self.stdscr.timeout(0)
+            else:
+                self.stdscr.timeout(-1)
             # event = self.stdscr.getch()
             event = self.getch()
-            if event == curses.KEY_MOUSE:
-                _, x, y, _, bstate = curses.getmouse()
-
-                if (bstate == UNCOVER_PRESSED
-                        and self.is_inside_minefield(y, x)):
-                    self.minefield.mouse_uncover_press(y, x)
-                elif bstate == UNCOVER_RELEASED:
-                    self.minefield.mouse_uncover_release(y, x)
-                elif bstate == MARK_PRESSED and self.is_inside_minefield(y, x):
-                    self.minefield.mouse_mark_press(y, x)
-                elif bstate == MARK_RELEASED:
-                    self.minefield.mouse_mark_release(y, x)
+            if self.minefield.core.poll():
+                self.replay_queued()
+            if event == curses.ERR:
+                if self.minefield.core.refine() and self.log is not None:
+                    self.log.write(event)
+            elif event == curses.KEY_MOUSE:
+                _, x, y, _, bstate = self.getmouse()
+
+                if self.minefield.core.busy or self.queued:
+                    self.queued.append((y, x, bstate))
+                else:
+                    self.handle_minefield_mouse(y, x, bstate)
 
                 if bstate == LEFT_PRESSED and self.is_inside_bar(y, x):
                     self.bar.mouse_press(y, x)
@@ -96,12 +121,58 @@ class FairMinesweeper:
             elif event == curses.ascii.ESC:
                 # TODO: menu
                 pass
+            self.bar.set_busy(self.minefield.core.busy)
+            self.log_progress()
+            if TRACE_BAR and self.minefield.core.tracer is not None:
+                self.bar.set_readout(self.minefield.core.tracer.readout())
+
+    def handle_minefield_mouse(self, y: int, x: int, bstate: int) -> None:
+        """Pass a mouse event to the minefield."""
+        if bstate == UNCOVER_PRESSED and self.is_inside_minefield(y, x):
+            self.minefield.mouse_uncover_press(y, x)
+        elif bstate == UNCOVER_RELEASED:
+            self.minefield.mouse_uncover_release(y, x)
+        elif bstate == MARK_PRESSED and self.is_inside_minefield(y, x):
+            self.minefield.mouse_mark_press(y, x)
+        elif bstate == MARK_RELEASED:
+            self.minefield.mouse_mark_release(y, x)
+
+    def replay_queued(self) -> None:
+        """Handle the queued minefield events until the solver is busy."""
+        while self.queued and not self.minefield.core.busy:
+            self.handle_minefield_mouse(*self.queued.popleft())
+
+    def log_progress(self) -> None:
+        """Log how far the solver got, once the worker has let it go."""
+        if self.minefield.core.busy:
+            return
+        solver = self.minefield.core.solver
+        if self.log is not None:
+            for progress in solver.reached:
+                self.log.write_progress(progress)
+        solver.reached.clear()
 
     def getch(self) -> int:
         """Get a curses event."""
         # This method was created to enable ovrwriting it with a method
         # returning emulated events for testing purposes.
-        return self.stdscr.getch()
+        event = self.stdscr.getch()
+        if self.log is not None and event not in (curses.ERR,
+                                                  curses.KEY_MOUSE):
+            self.log.write(event)
+        return event
+
+    def getmouse(self) -> MouseEvent:
+        """Get the mouse event of KEY_MOUSE."""
+        mouse = curses.getmouse()
+        if self.log is not None:
+            self.log.write(curses.KEY_MOUSE, mouse)
+        return mouse
+
+    def save(self) -> None:
+        """Save the game to SAVE_FILE if it is in progress."""
+        if SAVE_FILE and self.minefield.core.game_state == 1:
+            save(self.minefield.core, SAVE_FILE)
 
     def is_inside_minefield(self, y: int, x: int) -> bool:
         """Determine if char (y, x) is inside the minefield window."""
@@ -118,15 +189,48 @@ class FairMinesweeper:
                 offsetx <= x < offsetx + maxx)
 
     @classmethod
-    def run(cls) -> None:
+    def run(cls, resume: str | None = None) -> None:
+        """Play a new game, or the game saved to resume."""
         def main(stdscr: curses.window) -> None:
-            cls(stdscr).mainloop()
+            app = cls(stdscr, resume=resume)
+            try:
+                app.mainloop()
+            except KeyboardInterrupt:
+                app.save()
 
         # set the delay in ms after pressing the ESC key (the start of function
         # key sequence) to the minimum
         curses.set_escdelay(1)
         curses.wrapper(main)
 
+    @classmethod
+    def replay(cls, path: str) -> None:
+        """
+        Play the game of an event log again, as fast as the solver goes. The
+        solver runs in the foreground, so every action finds it done, as it
+        did when the game was played, and it goes as far as the log says
+        instead of looking at the clock. The game is the same even when the
+        solver ran out of its budget.
+        """
+        replay = EventReplay(path)
+
+        def main(stdscr: curses.window) -> None:
+            if stdscr.getmaxyx() != replay.size:
+                raise ValueError(f'the log was recorded on a screen of '
+                                 f'{replay.size}, this one is '
+                                 f'{stdscr.getmaxyx()}')
+            app = cls(stdscr, replay.seed, replaying=True)
+            app.getch = replay.getch  # type: ignore[method-assign]
+            app.getmouse = replay.getmouse  # type: ignore[method-assign]
+            app.minefield.core.solver.pace = replay.pace
+            try:
+                app.mainloop()
+            except EOFError:
+                pass
+
+        curses.set_escdelay(1)
+        curses.wrapper(main)
+
     @classmethod
     def emulated_run(cls) -> None:
         commands = [
@@ -150,7 +254,16 @@ class FairMinesweeper:
 
 
 if __name__ == '__main__':
-    FairMinesweeper.run()
+    parser = ArgumentParser(description='Fair minesweeper in the terminal.')
+    parser.add_argument('--replay', metavar='LOG',
+                        help='play the game of an event log again')
+    parser.add_argument('--resume', metavar='SAVE',
+                        help='continue a game saved when it was quit')
+    args = parser.parse_args()
+    if args.replay:
+        FairMinesweeper.replay(args.replay)
+    else:
+        FairMinesweeper.run(args.resume)
     # FairMinesweeper.emulated_run()
 
     # Mouse: 5 -> 1.8
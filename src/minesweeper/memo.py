@@ -0,0 +1,105 @@
+from __future__ import annotations
+from collections import OrderedDict
+from functools import cache
+from sys import getsizeof
+from typing import TypeAlias
+
+from boundary import Cell, BoundarySet
+from propagation import Constraint
+
+
+# the constraints of a region in its canonical position, sorted
+Key: TypeAlias = tuple[tuple[int, tuple[Cell, ...]], ...]
+
+# (sign of y, sign of x, swap y and x), the rotations and reflections
+_ORIENTATIONS: list[tuple[int, int, bool]] = [
+    (sy, sx, swap)
+    for swap in (False, True) for sy in (1, -1) for sx in (1, -1)
+]
+
+
+def canonical_form(constraints: list[Constraint]) \
+        -> tuple[Key, dict[Cell, Cell]]:
+    """
+    Return the key of the region given by constraints and the position of
+    each of its cells in the key. Of the 8 orientations of the region, each
+    moved to the origin, the least one is the key.
+    """
+    cells = {cell for _, region in constraints for cell in region}
+
+    def placed(sy: int, sx: int, swap: bool) \
+            -> tuple[Key, dict[Cell, Cell]]:
+        turned = {(y, x): (sx * x, sy * y) if swap else (sy * y, sx * x)
+                  for y, x in cells}
+        top = min(y for y, _ in turned.values())
+        left = min(x for _, x in turned.values())
+        placement = {cell: (y - top, x - left)
+                     for cell, (y, x) in turned.items()}
+        key = tuple(sorted(
+            (value, tuple(sorted(placement[cell] for cell in region)))
+            for value, region in constraints
+        ))
+        return key, placement
+
+    return min((placed(*orientation) for orientation in _ORIENTATIONS),
+               key=lambda item: item[0])
+
+
+class RegionCache:
+    """
+    The enumerated regions of the boundary by the shape of their constraints.
+
+    A region is stored in the position of its key, see canonical_form, so a
+    number pattern found again anywhere on the board, turned or mirrored,
+    or in another game, needs no enumeration. When the stored configurations
+    take more than max_bytes, the least recently used regions are evicted.
+    """
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        # the memory taken by the stored configurations
+        self.nbytes: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        # key: the region and its size in bytes, the least recently used
+        # first
+        self._entries: OrderedDict[Key, tuple[BoundarySet, int]] = \
+            OrderedDict()
+
+    def __repr__(self) -> str:
+        return (f'RegionCache({len(self._entries)} regions, {self.nbytes} '
+                f'bytes, {self.hits} hits, {self.misses} misses)')
+
+    def get(self, key: Key, placement: dict[Cell, Cell]) \
+            -> BoundarySet | None:
+        """
+        Return a copy of the region stored under key, placed back on the
+        cells of placement.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        back = {position: cell for cell, position in placement.items()}
+        return entry[0].relabel(back)
+
+    def put(self, key: Key, placement: dict[Cell, Cell],
+            boundaries: BoundarySet) -> None:
+        """Store a copy of boundaries, the region of key, under key."""
+        stored = boundaries.relabel(placement)
+        size = sum(map(getsizeof, stored.columns + stored.mines))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self.nbytes -= self._entries.pop(key)[1]
+        self._entries[key] = stored, size
+        self.nbytes += size
+        while self.nbytes > self.max_bytes:
+            self.nbytes -= self._entries.popitem(last=False)[1][1]
+
+
+@cache
+def get_region_cache(max_bytes: int) -> RegionCache:
+    """The cache shared by the games, so that the patterns carry over."""
+    return RegionCache(max_bytes)
@@ -0,0 +1,72 @@
+from __future__ import annotations
+from collections.abc import Iterable
+from typing import TypeAlias
+
+from boundary import Cell
+
+
+Constraint: TypeAlias = tuple[int, list[Cell]]
+
+
+def _reduce(value: int, cells: Iterable[Cell], mines: set[Cell],
+            safe: set[Cell]) -> tuple[int, frozenset[Cell]]:
+    """Remove the known cells from a constraint."""
+    unknown = []
+    for cell in cells:
+        if cell in mines:
+            value -= 1
+        elif cell not in safe:
+            unknown.append(cell)
+    return value, frozenset(unknown)
+
+
+def propagate(constraints: Iterable[Constraint], mines: set[Cell],
+              safe: set[Cell]) -> list[Constraint]:
+    """
+    Find the cells that are certainly mines or certainly empty and add them
+    to mines or safe. Each constraint is the value of an uncovered cell
+    together with its covered neighbours. Two rules are applied until nothing
+    changes:
+      - a constraint with no mines left has all cells empty, a constraint with
+        as many mines left as cells has all cells mines
+      - if the cells of constraint A are a subset of cells of constraint B,
+        the remaining cells of B contain exactly value(B) - value(A) mines
+    Return the constraints without the known cells.
+    """
+    reduced = [(value, frozenset(cells)) for value, cells in constraints]
+    found = True
+    while found:
+        reduced = [_reduce(value, cells, mines, safe)
+                   for value, cells in reduced]
+        reduced = [(value, cells) for value, cells in reduced if cells]
+
+        found = False
+        for value, cells in reduced:
+            if value == 0:
+                safe.update(cells)
+                found = True
+            elif value == len(cells):
+                mines.update(cells)
+                found = True
+        if found:
+            continue
+
+        # cell: indices of the constraints it appears in
+        containing: dict[Cell, list[int]] = {}
+        for i, (_, cells) in enumerate(reduced):
+            for cell in cells:
+                containing.setdefault(cell, []).append(i)
+        for value, cells in reduced:
+            # any superset shares the first cell
+            for j in containing[next(iter(cells))]:
+                other_value, other_cells = reduced[j]
+                if len(other_cells) > len(cells) and cells < other_cells:
+                    rest = other_cells - cells
+                    if other_value == value:
+                        safe.update(rest)
+                        found = True
+                    elif other_value - value == len(rest):
+                        mines.update(rest)
+                        found = True
+
+    return [(value, list(cells)) for value, cells in reduced]
@@ -0,0 +1,220 @@
+from __future__ import annotations
+import mmap
+from array import array
+from pathlib import Path
+from struct import Struct
+
+from boundary import UNTOUCHED, Cell, BoundarySet
+from game import GameCore, is_flagged, is_mine, is_covered
+from propagation import Constraint
+from solver import RegionKey
+from tracing import Tracer
+
+
+# magic, version, height, width, total mines, seed, game state, covered
+# cells, unmarked mines
+_HEADER = Struct('<4sBHHIQBIi')
+_MAGIC = b'FMSV'
+_VERSION = 1
+_UINT = Struct('<I')
+# the state of Random: its 625 words and the pending gauss, NaN for none
+_RANDOM = Struct('<625Id')
+
+
+class _Writer:
+    """Builds the save, cells are written as their indices."""
+    def __init__(self, width: int) -> None:
+        self.width = width
+        self.data = bytearray()
+
+    def uint(self, n: int) -> None:
+        self.data += _UINT.pack(n)
+
+    def integer(self, n: int) -> None:
+        """A nonnegative int of any size, the bitmaps of BoundarySet."""
+        raw = n.to_bytes((n.bit_length() + 7) // 8, 'little')
+        self.uint(len(raw))
+        self.data += raw
+
+    def cells(self, cells: list[Cell] | set[Cell]) -> None:
+        self.uint(len(cells))
+        self.data += array('I', [y * self.width + x for y, x in cells])
+
+    def constraints(self, constraints: list[Constraint]) -> None:
+        self.uint(len(constraints))
+        for value, cells in constraints:
+            self.uint(value)
+            self.cells(cells)
+
+    def boundaries(self, boundaries: BoundarySet) -> None:
+        self.cells(boundaries.cells)
+        self.uint(len(boundaries.mines))
+        for n in boundaries.columns + boundaries.mines:
+            self.integer(n)
+        self.integer(boundaries.size)
+        self.integer(boundaries.alive)
+
+
+class _Reader:
+    """Reads a save back, in the order it was written."""
+    def __init__(self, data: mmap.mmap, width: int, offset: int) -> None:
+        self.data = data
+        self.width = width
+        self.offset = offset
+
+    def uint(self) -> int:
+        n: int = _UINT.unpack_from(self.data, self.offset)[0]
+        self.offset += _UINT.size
+        return n
+
+    def bytes(self, n: int) -> bytes:
+        raw = self.data[self.offset:self.offset + n]
+        self.offset += n
+        return raw
+
+    def integer(self) -> int:
+        return int.from_bytes(self.bytes(self.uint()), 'little')
+
+    def cells(self) -> list[Cell]:
+        indices = array('I')
+        indices.frombytes(self.bytes(self.uint() * indices.itemsize))
+        return [divmod(i, self.width) for i in indices]
+
+    def constraints(self) -> list[Constraint]:
+        return [(self.uint(), self.cells()) for _ in range(self.uint())]
+
+    def boundaries(self) -> BoundarySet:
+        boundaries = BoundarySet()
+        boundaries.cells = self.cells()
+        boundaries.index = {cell: i for i, cell in enumerate(boundaries.cells)}
+        planes = self.uint()
+        boundaries.columns = [self.integer() for _ in boundaries.cells]
+        boundaries.mines = [self.integer() for _ in range(planes)]
+        boundaries.size = self.integer()
+        boundaries.alive = self.integer()
+        return boundaries
+
+
+def save(core: GameCore, path: str | Path) -> None:
+    """
+    Write the game to path. The solver is saved with its configurations, so
+    a game is resumed without solving anything again; a pending update is
+    waited for first.
+    """
+    if core.busy:
+        core.poll(None)
+    height, width = core.dimensions
+    writer = _Writer(width)
+    writer.data += _HEADER.pack(
+        _MAGIC, _VERSION, height, width, core.total_mines, core.seed,
+        core.game_state, core.covered, core.unmarked_mines
+    )
+    # the board and the neighbour counts, a byte per cell
+    writer.data += core.minefield + core.neighbour_mines
+    # the boundary in its order, which the order of the constraints follows
+    writer.cells(list(core.normal_directions))
+    writer.data += array('b', core.normal_directions.values())
+    writer.uint(UNTOUCHED in core.possible)
+    writer.cells([pos for pos in core.possible if pos != UNTOUCHED])
+    _, words, gauss = core.random.getstate()
+    writer.data += _RANDOM.pack(*words, float('nan') if gauss is None
+                                else gauss)
+
+    known_mines, known_safe, components, solved, unfinished, untouched = \
+        core.solver.state()
+    writer.cells(known_mines)
+    writer.cells(known_safe)
+    writer.uint(untouched)
+    # a finished region is a copy of a region of solved cut by the total
+    # of mines, only its alive bitmap is written then
+    writer.uint(len(solved))
+    # cells: the index of the region in solved and the region
+    regions: dict[tuple[Cell, ...], tuple[int, BoundarySet]] = {}
+    for key, boundaries in solved.items():
+        writer.constraints([(value, list(cells)) for value, cells in key])
+        writer.boundaries(boundaries)
+        regions[tuple(boundaries.cells)] = (len(regions), boundaries)
+    writer.uint(len(components))
+    for boundaries in components:
+        i, region = regions.get(tuple(boundaries.cells), (len(solved), None))
+        if region is not None and region.size == boundaries.size and \
+                region.columns == boundaries.columns:
+            writer.uint(i)
+            writer.integer(boundaries.alive)
+        else:
+            writer.uint(len(solved))
+            writer.boundaries(boundaries)
+    writer.uint(len(unfinished))
+    for cells, constraints in unfinished:
+        writer.cells(cells)
+        writer.constraints(constraints)
+
+    Path(path).write_bytes(writer.data)
+
+
+def load(path: str | Path, background: bool = False,
+         tracer: Tracer | None = None) -> GameCore:
+    """Read the game saved to path, see save."""
+    with open(path, 'rb') as file, \
+            mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        (magic, version, height, width, total_mines, seed, game_state,
+         covered, unmarked_mines) = _HEADER.unpack_from(data)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f'{path} is not a saved game of version '
+                             f'{_VERSION}')
+        reader = _Reader(data, width, _HEADER.size)
+        core = GameCore(height, width, total_mines, seed, background, tracer)
+        cells = height * width
+        core.minefield[:] = reader.bytes(cells)
+        core.neighbour_mines[:] = reader.bytes(cells)
+        boundary = reader.cells()
+        core.normal_directions = dict(zip(
+            boundary, array('b', reader.bytes(len(boundary)))
+        ))
+        core.game_state = game_state
+        core.covered = covered
+        core.unmarked_mines = unmarked_mines
+
+        # the flags and the untouched cells follow from the board
+        core.flags = set()
+        core.mine_cells = set()
+        core.empty_cells = set()
+        for i, number in enumerate(core.minefield):
+            cell = divmod(i, width)
+            if is_flagged(number):
+                core.flags.add(cell)
+            if is_covered(number) and cell not in core.normal_directions:
+                (core.mine_cells if is_mine(number)
+                 else core.empty_cells).add(cell)
+        untouched_safe = reader.uint()
+        core.possible = set(reader.cells())
+        if untouched_safe:
+            core.possible.add(UNTOUCHED)
+        *words, gauss = _RANDOM.unpack_from(data, reader.offset)
+        reader.offset += _RANDOM.size
+        core.random.setstate((core.random.getstate()[0], tuple(words),
+                              None if gauss != gauss else gauss))
+
+        known_mines = set(reader.cells())
+        known_safe = set(reader.cells())
+        untouched = reader.uint()
+        solved: dict[RegionKey, BoundarySet] = {}
+        for _ in range(reader.uint()):
+            key = frozenset((value, frozenset(cells))
+                            for value, cells in reader.constraints())
+            solved[key] = reader.boundaries()
+        regions = list(solved.values())
+        components = []
+        for _ in range(reader.uint()):
+            i = reader.uint()
+            if i < len(regions):
+                boundaries = regions[i].copy()
+                boundaries.alive = reader.integer()
+            else:
+                boundaries = reader.boundaries()
+            components.append(boundaries)
+        unfinished = [(reader.cells(), reader.constraints())
+                      for _ in range(reader.uint())]
+    core.solver.restore((known_mines, known_safe, components, solved,
+                         unfinished, untouched))
+    return core
@@ -0,0 +1,368 @@
+from __future__ import annotations
+import json
+import os
+import resource
+from argparse import ArgumentParser
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from random import Random
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Any, Literal, TypeAlias
+
+import configuration as conf
+from benchmark import parse_budget, summarize
+from boundary import UNTOUCHED, Cell
+from game import GameCore, Event, is_mine, is_pressable, is_covered, \
+    is_flagged
+from memo import get_region_cache
+from savegame import load, save
+
+
+# what a bot does next: (action, y, x)
+Action: TypeAlias = tuple[Literal['uncover', 'flag', 'chord'], int, int]
+# a bot chooses the next action in a game, random being its only source of
+# randomness
+Bot: TypeAlias = Callable[[GameCore, Random], Action]
+
+
+def _covered(core: GameCore) -> list[Cell]:
+    """The covered cells that are not flagged."""
+    return [core.topology.cell(i) for i, number in enumerate(core.minefield)
+            if is_pressable(number)]
+
+
+def random_bot(core: GameCore, rng: Random) -> Action:
+    """Uncover a random covered cell, a guess every time."""
+    return ('uncover', *rng.choice(_covered(core)))
+
+
+def safe_bot(core: GameCore, rng: Random) -> Action:
+    """Uncover a random cell of possible, guess when there is none."""
+    if not core.possible:
+        return random_bot(core, rng)
+    pos = rng.choice(sorted(core.possible, key=str))
+    if pos == UNTOUCHED:
+        pos = rng.choice([cell for cell in _covered(core)
+                          if cell not in core.normal_directions])
+    return ('uncover', *pos)
+
+
+def flag_bot(core: GameCore, rng: Random) -> Action:
+    """
+    Flag the cells that are certainly mines and chord the numbers around
+    them, otherwise play as safe_bot.
+    """
+    chords = set()
+    for y, x in sorted(core.normal_directions):
+        if (is_pressable(core.minefield[y * core.width + x]) and
+                not core.region_can_be_empty((y, x))):
+            return ('flag', y, x)
+        for ny, nx in core.topology.around[y][x]:
+            if not is_covered(core.minefield[ny * core.width + nx]):
+                chords.add((ny, nx))
+    for y, x in sorted(chords):
+        cells, chordable = core.chord_cells(y, x)
+        if chordable and core.possible.issuperset(cells):
+            return ('chord', y, x)
+    return safe_bot(core, rng)
+
+
+# the bots to choose from on the command line
+BOTS: dict[str, Bot] = {
+    'random': random_bot,
+    'safe': safe_bot,
+    'flag': flag_bot,
+}
+
+
+class Violations:
+    """
+    The invariants of the game, checked around every action of a game.
+
+    The minefield must be consistent: the numbers match the mines, the
+    total of mines is kept and no cell of possible is a mine. The guesses
+    must be fair: a cell known to be safe never explodes; with the solver
+    exact, a guess explodes iff there was a safe cell to uncover instead or
+    the cell was certainly a mine.
+    """
+    def __init__(self, core: GameCore) -> None:
+        self.core = core
+        # the violations found, 'click n: what happened'
+        self.found: list[str] = []
+
+    def check_action(self, action: Action, clicks: int) -> None:
+        """Play action, checking that its outcome was fair."""
+        kind, y, x = action
+        core = self.core
+        exact = not core.solver.approximate
+        if kind == 'uncover':
+            pos = core.region(y, x)
+            safe = pos in core.possible
+            any_safe = bool(core.possible)
+            can_be_empty = core.region_can_be_empty(pos)
+            core.uncover(y, x)
+            exploded = core.game_state == 2
+            if exploded and safe:
+                self._report(clicks, f'{(y, x)} exploded, it was safe')
+            elif exact and exploded and not any_safe and can_be_empty:
+                self._report(clicks, f'{(y, x)} exploded, it could be empty '
+                                     f'and there was no safe cell')
+            elif exact and not exploded and not can_be_empty:
+                self._report(clicks, f'{(y, x)} did not explode, it was '
+                                     f'certainly a mine')
+            elif exact and not exploded and not safe and any_safe:
+                self._report(clicks, f'{(y, x)} did not explode, a safe '
+                                     f'cell was left for a guess')
+        elif kind == 'chord':
+            cells = core.chord_cells(y, x)[0]
+            safe = core.possible.issuperset(core.region(*cell)
+                                            for cell in cells)
+            core.chord(y, x)
+            if core.game_state == 2 and safe:
+                self._report(clicks, f'chord on {(y, x)} exploded, all of '
+                                     f'{cells} were safe')
+        else:
+            core.flag(y, x)
+        self.check_minefield(clicks)
+
+    def check_resumed(self, resumed: GameCore, events: list[Event],
+                      clicks: int) -> bool:
+        """
+        Check that resumed, a saved and loaded copy of the game given the
+        same actions, went on the same way. Return False if it has not.
+        """
+        core = self.core
+        if (resumed.take_events() != events or
+                resumed.minefield != core.minefield or
+                resumed.possible != core.possible or
+                resumed.random.getstate() != core.random.getstate()):
+            self._report(clicks, 'the resumed game went another way')
+            return False
+        return True
+
+    def check_minefield(self, clicks: int) -> None:
+        """Check the consistency of the minefield after an action."""
+        core = self.core
+        mines = 0
+        for i, number in enumerate(core.minefield):
+            if is_mine(number):
+                mines += 1
+            elif not is_covered(number) and \
+                    number != core.neighbour_mines[i]:
+                self._report(clicks, f'{core.topology.cell(i)} shows '
+                                     f'{number}, has '
+                                     f'{core.neighbour_mines[i]} mines')
+        if mines != core.total_mines:
+            self._report(clicks, f'{mines} mines, not {core.total_mines}')
+        for pos in core.possible:
+            if (core.mine_cells if pos == UNTOUCHED else
+                    is_mine(core.minefield[pos[0] * core.width + pos[1]])):
+                self._report(clicks, f'{pos} is possible, it is a mine')
+        if (core.game_state == 3) != (core.covered == core.total_mines):
+            self._report(clicks, f'state {core.game_state} with '
+                                 f'{core.covered} cells covered')
+        if core.unmarked_mines != core.total_mines - sum(
+                map(is_flagged, core.minefield)):
+            self._report(clicks, f'{core.unmarked_mines} unmarked mines')
+
+    def check_counts(self, clicks: int) -> None:
+        """Check the counts of mines around each cell, slow."""
+        core = self.core
+        topology = core.topology
+        for i in range(len(core.minefield)):
+            mines = sum(is_mine(core.minefield[j])
+                        for j in topology.neighbours[topology.offsets[i]:
+                                                     topology.offsets[i + 1]])
+            if mines != core.neighbour_mines[i]:
+                self._report(clicks, f'{topology.cell(i)} counts '
+                                     f'{core.neighbour_mines[i]} mines '
+                                     f'around, there are {mines}')
+
+    def _report(self, clicks: int, what: str) -> None:
+        self.found.append(f'click {clicks}: {what}')
+
+
+def _resumed(core: GameCore) -> GameCore:
+    """A copy of the game made by saving and loading it."""
+    with TemporaryDirectory() as directory:
+        path = Path(directory) / 'game'
+        save(core, path)
+        return load(path)
+
+
+def play(bot: str, height: int, width: int, mines: int, seed: int,
+         budget: float | None, resume: int | None = None,
+         memory: int | None = None) -> dict[str, Any]:
+    """
+    Play one game seeded by seed with bot, checking the invariants. Runs in
+    a worker process, so it takes the budget of the solver along. After
+    resume clicks, the game is saved and loaded, and the copy must go on
+    the same way given the same actions. Given memory, the worker may take
+    that many bytes, a game needing more fails with a MemoryError.
+    """
+    conf.SOLVE_BUDGET = budget
+    if memory is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+    # the game must replay from its seed alone, whatever the process played
+    # before
+    get_region_cache.cache_clear()
+    core = GameCore(height, width, mines, seed)
+    rng = Random(seed)
+    violations = Violations(core)
+    latencies = []
+    resumed = None
+    start = perf_counter()
+    while core.game_state < 2:
+        if len(latencies) == resume:
+            resumed = _resumed(core)
+        action = BOTS[bot](core, rng)
+        click = perf_counter()
+        violations.check_action(action, len(latencies))
+        latencies.append(perf_counter() - click)
+        events = core.take_events()
+        if resumed is not None:
+            kind, y, x = action
+            getattr(resumed, kind)(y, x)
+            if not violations.check_resumed(resumed, events, len(latencies)):
+                resumed = None
+    violations.check_counts(len(latencies))
+    return {
+        'seed': seed,
+        'won': core.game_state == 3,
+        'seconds': perf_counter() - start,
+        'latencies': latencies,
+        'violations': violations.found,
+    }
+
+
+def play_all(bot: str, height: int, width: int, mines: int,
+             seeds: list[int], budget: float | None,
+             processes: int | None, resume: int | None = None,
+             memory: int | None = None) \
+        -> tuple[dict[int, dict[str, Any]], dict[int, str]]:
+    """
+    Play a game for every seed in a process pool. Return the results of the
+    games and the errors of the games that failed, by seed. A game that
+    kills its worker breaks the whole pool; the games it took along are
+    then played again, each in its own pool, so that only the culprit fails.
+    """
+    games: dict[int, dict[str, Any]] = {}
+    failures: dict[int, str] = {}
+    broken = []
+    with ProcessPoolExecutor(processes) as executor:
+        futures = {executor.submit(play, bot, height, width, mines, seed,
+                                   budget, resume, memory): seed
+                   for seed in seeds}
+        for future in as_completed(futures):
+            seed = futures[future]
+            try:
+                games[seed] = future.result()
+            except BrokenProcessPool:
+                broken.append(seed)
+            except MemoryError as error:
+                failures[seed] = f'MemoryError: {error}' if memory is None \
+                    else f'it needed more than {memory} bytes'
+            except Exception as error:
+                failures[seed] = f'{type(error).__name__}: {error}'
+    for seed in sorted(broken):
+        if len(seeds) == 1:
+            failures[seed] = 'its worker process died'
+            continue
+        played, failed = play_all(bot, height, width, mines, [seed], budget,
+                                  1, resume, memory)
+        games.update(played)
+        failures.update(failed)
+    return games, failures
+
+
+def main() -> None:
+    parser = ArgumentParser(
+        description='Play many games with a bot in a process pool, checking '
+                    'the invariants of the game.'
+    )
+    parser.add_argument('--bot', choices=BOTS, default='safe')
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--size', metavar='HxW', default='16x16')
+    parser.add_argument('--mines', type=int, default=40)
+    parser.add_argument('--seed', type=int, default=0,
+                        help='the seed of the first game, the others follow')
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    parser.add_argument('--budget', type=parse_budget, default=conf.SOLVE_BUDGET,
+                        help='seconds the solver may spend after a click, '
+                             'none for no limit (default SOLVE_BUDGET of '
+                             'the configuration); the fairness of the '
+                             'guesses is checked only while the solver is '
+                             'exact. Without a limit the solver is always '
+                             'exact, but it is unbounded: from 16x16 with '
+                             '40 mines a click can take minutes and '
+                             'gigabytes, see --memory')
+    parser.add_argument('--memory', type=int, metavar='MB',
+                        help='the memory each worker process may take, a '
+                             'game needing more fails instead of the '
+                             'system killing the worker')
+    parser.add_argument('--resume', type=int, metavar='CLICKS',
+                        help='save and resume every game after this many '
+                             'clicks, checking that it goes on the same; '
+                             'needs --budget none')
+    parser.add_argument('--output', type=Path,
+                        help='write the results as JSON to this file')
+    args = parser.parse_args()
+    if args.resume is not None and args.budget is not None:
+        parser.error('--resume needs --budget none, with a limit the games '
+                     'depend on the speed of the machine')
+    height, width = map(int, args.size.split('x'))
+
+    start = perf_counter()
+    games, failures = play_all(
+        args.bot, height, width, args.mines,
+        list(range(args.seed, args.seed + args.games)), args.budget,
+        args.processes, args.resume,
+        None if args.memory is None else args.memory * 2**20
+    )
+    latencies: list[float] = []
+    wins = 0
+    violations: list[str] = []
+    for seed, game in sorted(games.items()):
+        latencies.extend(game['latencies'])
+        wins += game['won']
+        violations.extend(f'seed {seed}, {violation}'
+                          for violation in game['violations'])
+    seconds = perf_counter() - start
+
+    results = {
+        'bot': args.bot,
+        'height': height,
+        'width': width,
+        'mines': args.mines,
+        'budget': args.budget,
+        'games': args.games,
+        'seconds': round(seconds, 3),
+        'games_per_second': round(args.games / seconds, 3),
+        'clicks': len(latencies),
+        'latency_ms': summarize(latencies),
+        'win_rate': round(wins / args.games, 4),
+        'violations': violations,
+        'failures': [f'seed {seed}, {failure}'
+                     for seed, failure in sorted(failures.items())],
+    }
+    print(f'{args.games} games in {seconds:.1f} s, '
+          f'{results["games_per_second"]} games/s, '
+          f'{wins / args.games:.1%} won')
+    print('click latency (ms): ' + ', '.join(
+        f'{name} {value:.2f}' for name, value in results['latency_ms'].items()
+    ))
+    print(f'{len(violations)} invariant violations')
+    for violation in violations[:20]:
+        print('  ' + violation)
+    print(f'{len(failures)} failed games')
+    for failure in results['failures'][:20]:
+        print('  ' + failure)
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,619 @@
+from __future__ import annotations
+from collections.abc import Callable, Generator, Iterable
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from fractions import Fraction
+from functools import cache
+from random import Random
+from time import perf_counter
+from typing import Protocol, TypeAlias
+
+from backtracking import search
+from boundary import UNTOUCHED, Cell, Region, Boundary, BoundarySet, \
+    less_than, add_counts
+from counting import Counts
+from memo import Key, RegionCache, canonical_form
+from propagation import Constraint, propagate
+
+
+# the constraints of a region, which determine its configurations
+RegionKey: TypeAlias = frozenset[tuple[int, frozenset[Cell]]]
+# what a solver needs to be restored, see BoundarySolver.state
+SolverState: TypeAlias = tuple[
+    set[Cell], set[Cell], list[BoundarySet], dict[RegionKey, BoundarySet],
+    list[tuple[list[Cell], list[Constraint]]], int
+]
+
+# how far a piece of work limited by the budget got: the parts it finished
+# and the steps it took into the next one, see BoundarySolver.reached
+Progress: TypeAlias = tuple[int, int]
+
+# a region with at least this many cells is split among the workers
+_SPLIT_CELLS = 24
+# the seconds to wait for the workers between checks of the deadline
+_WAIT = 0.005
+# the measurements counted from zero by every update
+_STATS = ('propagate_ms', 'split_ms', 'enumerate_ms', 'combine_ms',
+          'regions', 'reused', 'resumed', 'cached')
+
+
+class BoundarySolver(Protocol):
+    """
+    The knowledge about the covered cells derived from the uncovered ones.
+
+    The Minefield feeds the values of the uncovered cells on the inner
+    boundary after every click and asks which regions are safe. When the
+    player guesses, it asks for a boundary with a region fixed to be (or not
+    to be) a mine and rearranges the mines accordingly.
+
+    A solver may run out of its time budget. Its state is then approximate:
+    it claims only the cells it has proven safe, draw may give up and the
+    solving continues by refine.
+    """
+    # True while the solver has not finished solving the last update
+    approximate: bool
+    # the measurements of the last update and the refinements after it,
+    # name: value, the times in milliseconds
+    stats: dict[str, float]
+    # how far every piece of work limited by the budget got (an update, a
+    # refinement or a draw from an unfinished region), in order; the event
+    # log takes them away to replay the game
+    reached: list[Progress]
+    # when set, such work goes as far as the progress it returns instead of
+    # looking at the clock, so that a replay reaches the same states
+    pace: Callable[[], Progress] | None
+
+    def update(self, constraints: list[Constraint], untouched: int) -> None:
+        """
+        Recompute the knowledge from constraints, the values of the
+        uncovered cells together with their covered neighbours. untouched is
+        the number of covered cells that are in no constraint.
+        """
+
+    def refine(self, budget: float | None) -> bool:
+        """
+        Continue solving an approximate state for at most budget seconds
+        (None for no limit). Return True if the state has become exact.
+        """
+
+    def discard(self, cell: Cell) -> None:
+        """Forget a boundary cell that has been uncovered."""
+
+    def can_be_mine(self, pos: Region) -> bool:
+        """Is there a complete minefield with a mine in pos?"""
+
+    def can_be_empty(self, pos: Region) -> bool:
+        """Is there a complete minefield with pos empty?"""
+
+    def safe_cells(self) -> Iterable[Cell]:
+        """Return the boundary cells that cannot be mines."""
+
+    def probability(self, pos: Region) -> Fraction:
+        """The probability that a cell in pos is a mine."""
+
+    def draw(self, pos: Region | None = None, mine: bool = True) \
+            -> Boundary | None:
+        """
+        Return a random possible boundary having (or not having) a mine in
+        pos. For UNTOUCHED, a particular untouched cell is meant. In an
+        approximate state the boundary may cover only a part of the
+        boundary, None means that no such boundary has been found.
+        """
+
+    def state(self) -> SolverState:
+        """
+        Return the known mines, the known safe cells, the finished regions,
+        the regions of the last update by their constraints (to be reused),
+        the unfinished regions (cells, constraints) and the number of
+        untouched cells. Nothing of it may be changed.
+        """
+
+    def restore(self, state: SolverState) -> None:
+        """
+        Take over the state of a solver, without enumerating the finished
+        regions again. The unfinished ones start over.
+        """
+
+
+class EnumerationSolver:
+    """
+    The reference solver, all configurations of the boundary are enumerated.
+
+    The certain cells are found by propagation first, the rest of the
+    boundary is split into independent regions, all possible configurations
+    of each are stored in a BoundarySet and the regions are combined by
+    counting the complete minefields.
+
+    The regions are enumerated step by step. When the budget (in seconds,
+    None for no limit) runs out, the unfinished regions are left pending and
+    only propagation and the finished regions are trusted.
+
+    With more than one worker, the regions are enumerated in a process pool
+    instead, a large region split into branches by fixing its first cells.
+    A region found in the cache is not enumerated at all.
+
+    A region whose constraints are the same as after the previous update,
+    i.e. one the click has not touched, keeps its configurations, so the
+    work of an update grows with the change rather than with the boundary.
+    An untouched region left pending goes on where its enumeration stopped.
+    """
+    def __init__(self, total_mines: int, budget: float | None = None,
+                 workers: int = 1, cache: RegionCache | None = None,
+                 rng: Random | None = None) -> None:
+        self.total_mines = total_mines
+        self.budget = budget
+        self.workers = workers
+        self.cache = cache
+        # the source of the random draws, the game's own to replay it
+        self.rng = rng if rng is not None else Random()
+        self.approximate: bool = False
+        self.reached: list[Progress] = []
+        self.pace: Callable[[], Progress] | None = None
+        # the regions still being enumerated, cell: (cells, constraints) of
+        # its region
+        self.pending: dict[Cell, tuple[list[Cell], list[Constraint]]] = {}
+        self._enumerations: list[tuple[
+            list[Cell], RegionKey, Generator[None, None, BoundarySet]
+        ]] = []
+        # the finished regions of the last update, before _combine cut them
+        self._solved: dict[RegionKey, BoundarySet] = {}
+        self._untouched: int = 0
+        self.stats: dict[str, float] = {}
+        # the boundary cells that are certainly mines, resp. certainly empty
+        # given the uncovered cells. These are not part of any component.
+        self.known_mines: set[Cell] = set()
+        self.known_safe: set[Cell] = set()
+        # the rest of the boundary split into independent regions, each
+        # holding the set of its possible configurations
+        self.components: list[BoundarySet] = []
+        # the component each boundary cell belongs to
+        self.component: dict[Cell, BoundarySet] = dict()
+        # the numbers of complete minefields, used to choose a random one
+        self.counts: Counts
+
+    def update(self, constraints: list[Constraint], untouched: int) -> None:
+        start = perf_counter()
+        deadline = None if self.budget is None else start + self.budget
+        self.stats = dict.fromkeys(_STATS, 0)
+        constraints = propagate(constraints, self.known_mines,
+                                self.known_safe)
+        self.stats['propagate_ms'] = _since(start)
+        self.components = []
+        self.component = dict()
+        self.pending = dict()
+        self._untouched = untouched
+        solved, self._solved = self._solved, {}
+        running = {key: enumeration
+                   for _, key, enumeration in self._enumerations}
+        self._enumerations = []
+        start = perf_counter()
+        regions = self._split_components(constraints)
+        self.stats['split_ms'] = _since(start)
+        self.stats['regions'] = len(regions)
+        for cells, region_constraints in regions:
+            for cell in cells:
+                self.pending[cell] = (cells, region_constraints)
+            key = _region_key(region_constraints)
+            if key in solved:
+                enumeration = self._ready(solved[key])
+                self.stats['reused'] += 1
+            elif key in running:
+                # unfinished at the previous update, it goes on from there
+                enumeration = running.pop(key)
+                self.stats['resumed'] += 1
+            else:
+                enumeration = self._start(cells, region_constraints)
+            self._enumerations.append((cells, key, enumeration))
+        # the regions of the previous update that are gone
+        for enumeration in running.values():
+            enumeration.close()
+        self.approximate = not self._enumerate(deadline)
+        if not self.approximate:
+            self._combine(untouched)
+
+    def refine(self, budget: float | None) -> bool:
+        deadline = None if budget is None else perf_counter() + budget
+        if not self.approximate or not self._enumerate(deadline):
+            return False
+        self.approximate = False
+        self._combine(self._untouched)
+        return True
+
+    def state(self) -> SolverState:
+        # the cells of a region share its tuple
+        unfinished = list({id(region): region
+                           for region in self.pending.values()}.values())
+        return (self.known_mines, self.known_safe, self.components,
+                self._solved, unfinished, self._untouched)
+
+    def restore(self, state: SolverState) -> None:
+        (self.known_mines, self.known_safe, self.components, self._solved,
+         unfinished, self._untouched) = state
+        self.stats = dict.fromkeys(_STATS, 0)
+        self.component = {cell: boundaries for boundaries in self.components
+                          for cell in boundaries.cells}
+        self.pending = {}
+        for _, _, enumeration in self._enumerations:
+            enumeration.close()
+        self._enumerations = []
+        for cells, constraints in unfinished:
+            for cell in cells:
+                self.pending[cell] = (cells, constraints)
+            self._enumerations.append((cells, _region_key(constraints),
+                                       self._start(cells, constraints)))
+        self.approximate = bool(unfinished)
+        if not self.approximate:
+            # cheap next to the enumeration, the components are cut already
+            self._combine(self._untouched)
+
+    def _start(self, cells: list[Cell], constraints: list[Constraint]) \
+            -> Generator[None, None, BoundarySet]:
+        """
+        Start enumerating a region, return the generator finishing it. With
+        workers the region is submitted right away, so that all regions are
+        enumerated at once.
+        """
+        if self.cache is None:
+            return self._launch(cells, constraints)
+        key, placement = canonical_form(constraints)
+        boundaries = self.cache.get(key, placement)
+        if boundaries is not None:
+            self.stats['cached'] += 1
+            return self._ready(boundaries)
+        return self._remember(key, placement,
+                              self._launch(cells, constraints))
+
+    def _launch(self, cells: list[Cell], constraints: list[Constraint]) \
+            -> Generator[None, None, BoundarySet]:
+        """Start the enumeration itself, see _start."""
+        if self.workers <= 1:
+            return self._enumeration(cells, constraints)
+        branches = [constraints]
+        if len(cells) >= _SPLIT_CELLS:
+            # every combination of values of the first cells, a few more
+            # branches than workers to even out their sizes
+            for cell in cells[:(self.workers - 1).bit_length() + 1]:
+                branches = [branch + [(mine, [cell])]
+                            for branch in branches for mine in (0, 1)]
+        executor = _executor(self.workers)
+        futures = [executor.submit(_complete, type(self), cells, branch)
+                   for branch in branches]
+        gathering = self._gather(futures)
+        next(gathering)
+        return gathering
+
+    @staticmethod
+    def _ready(boundaries: BoundarySet) \
+            -> Generator[None, None, BoundarySet]:
+        """The enumeration of a region that is known already."""
+        return boundaries
+        yield  # a generator nevertheless
+
+    def _remember(self, key: Key, placement: dict[Cell, Cell],
+                  enumeration: Generator[None, None, BoundarySet]) \
+            -> Generator[None, None, BoundarySet]:
+        """Pass enumeration through, cache its result when it finishes."""
+        boundaries = yield from enumeration
+        if self.cache is not None:
+            self.cache.put(key, placement, boundaries)
+        return boundaries
+
+    @staticmethod
+    def _gather(futures: list[Future[BoundarySet]]) \
+            -> Generator[None, None, BoundarySet]:
+        """
+        Wait for the branches of a region, yield every _WAIT seconds. The
+        branches are cancelled when the region is dropped unfinished, the
+        first yield is taken by _launch so that it holds even before the
+        first wait.
+        """
+        try:
+            yield
+            while wait(futures, _WAIT).not_done:
+                yield
+        except GeneratorExit:
+            for future in futures:
+                future.cancel()
+            raise
+        return BoundarySet.union([future.result() for future in futures])
+
+    def _enumerate(self, deadline: float | None) -> bool:
+        """
+        Advance the pending enumerations until deadline, or as far as pace
+        says. Return True when all of them are finished. The progress counts
+        the regions finished and the steps into the next one; waiting for
+        the workers is no step, it does not change the enumeration.
+        """
+        start = perf_counter()
+        goal = None if self.pace is None else self.pace()
+        done = steps = 0
+        while self._enumerations:
+            cells, key, enumeration = self._enumerations[0]
+            try:
+                while _going((done, steps), goal, deadline):
+                    next(enumeration)
+                    steps += self.workers <= 1
+                self.stats['enumerate_ms'] += _since(start)
+                self.stats['pending'] = len(self.pending)
+                self.reached.append((done, steps))
+                return False
+            except StopIteration as finished:
+                boundaries = finished.value
+            done, steps = done + 1, 0
+            self._enumerations.pop(0)
+            self._solved[key] = boundaries.copy()
+            self.components.append(boundaries)
+            for cell in cells:
+                self.component[cell] = boundaries
+                del self.pending[cell]
+        self.stats['enumerate_ms'] += _since(start)
+        self.stats['pending'] = 0
+        self.reached.append((done, steps))
+        return True
+
+    def discard(self, cell: Cell) -> None:
+        self.known_safe.discard(cell)
+
+    def can_be_mine(self, pos: Region) -> bool:
+        if not self.approximate:
+            return self.counts.can_be_mine(pos)
+        # a finished region without a mine on pos has none globally either,
+        # anything else is not proven
+        if pos in self.known_mines or pos in self.known_safe:
+            return pos in self.known_mines
+        if pos in self.component:
+            return bool(self.component[pos].mask(pos, True))
+        return True
+
+    def can_be_empty(self, pos: Region) -> bool:
+        if not self.approximate:
+            return self.counts.can_be_empty(pos)
+        if pos in self.known_mines or pos in self.known_safe:
+            return pos in self.known_safe
+        if pos in self.component:
+            return bool(self.component[pos].mask(pos, False))
+        return True
+
+    def safe_cells(self) -> Iterable[Cell]:
+        yield from self.known_safe
+        for cell in self.component:
+            if not self.can_be_mine(cell):
+                yield cell
+
+    def probability(self, pos: Region) -> Fraction:
+        if not self.approximate:
+            return self.counts.probability(pos)
+        # the unweighted estimate of the finished regions, the density of
+        # the unknown mines elsewhere
+        if pos in self.known_mines or pos in self.known_safe:
+            return Fraction(pos in self.known_mines)
+        if pos in self.component:
+            boundaries = self.component[pos]
+            mask = boundaries.mask(pos, True)
+            return Fraction(mask.bit_count(), len(boundaries))
+        unknown = self._untouched + len(self.pending) + sum(
+            len(boundaries.cells) for boundaries in self.components
+        )
+        return Fraction(self.total_mines - len(self.known_mines), unknown)
+
+    def draw(self, pos: Region | None = None, mine: bool = True) \
+            -> Boundary | None:
+        if not self.approximate:
+            return self.counts.draw(self.rng, pos, mine)
+        if pos is None:
+            return None
+        boundary = Boundary()
+        if pos == UNTOUCHED:
+            # the boundary stays, the untouched mines are moved around it
+            return boundary
+        if pos in self.known_mines or pos in self.known_safe:
+            # nothing to rearrange when the cell is as asked
+            return boundary if (pos in self.known_mines) == mine else None
+        if pos in self.component:
+            boundaries = self.component[pos]
+            mask = boundaries.mask(pos, mine)
+            return boundaries.get(boundaries.choice(mask, self.rng)) \
+                if mask else None
+
+        # the first solution of the region with pos fixed, the cells are
+        # shuffled so that it is not always the same one
+        cells, constraints = self.pending[pos]
+        cells = cells.copy()
+        self.rng.shuffle(cells)
+        deadline = None if self.budget is None else \
+            perf_counter() + self.budget
+        goal = None if self.pace is None else self.pace()
+        # the progress counts the pauses of the search
+        pauses = 0
+        for config in search(cells, constraints + [(int(mine), [pos])]):
+            if config is None:
+                pauses += 1
+                if not _going((0, pauses), goal, deadline):
+                    break
+                continue
+            self.reached.append((1, pauses))
+            for i, (y, x) in enumerate(cells):
+                if config >> i & 1:
+                    boundary.set_mine(y, x)
+                else:
+                    boundary.set_empty(y, x)
+            return boundary
+        self.reached.append((0, pauses))
+        return None
+
+    @staticmethod
+    def _split_components(constraints: list[Constraint]) \
+            -> list[tuple[list[Cell], list[Constraint]]]:
+        """
+        Split the cells of constraints into regions that share no constraint.
+        For each region return its cells, ordered so that neighbouring cells
+        are close, and its constraints.
+        """
+        # cell: indices of the constraints it appears in
+        touching: dict[Cell, list[int]] = {}
+        for i, (_, cells) in enumerate(constraints):
+            for cell in cells:
+                touching.setdefault(cell, []).append(i)
+
+        # breadth-first search over cells sharing a constraint
+        components = []
+        visited: set[Cell] = set()
+        used: set[int] = set()
+        for start in touching:
+            if start in visited:
+                continue
+            visited.add(start)
+            cells: list[Cell] = [start]
+            region_constraints: list[Constraint] = []
+            for cell in cells:  # cells grow during the iteration
+                for i in touching[cell]:
+                    if i in used:
+                        continue
+                    used.add(i)
+                    region_constraints.append(constraints[i])
+                    for neighbour in constraints[i][1]:
+                        if neighbour not in visited:
+                            visited.add(neighbour)
+                            cells.append(neighbour)
+            components.append((cells, region_constraints))
+        return components
+
+    def _combine(self, untouched: int) -> None:
+        """
+        Match the numbers of mines of all components against total_mines,
+        drop the configurations that cannot be completed and count the
+        complete minefields.
+        """
+        start = perf_counter()
+        enumerated = sum(map(len, self.components))
+        # the bitmap of numbers of mines the boundary is allowed to contain
+        window = (1 << self.total_mines + 1) - \
+            (1 << max(self.total_mines - untouched, 0))
+        counts = [boundaries.mine_counts() for boundaries in self.components]
+        prefix = [1 << len(self.known_mines)]
+        for c in counts:
+            prefix.append(add_counts(prefix[-1], c))
+        suffix = [1]
+        for c in reversed(counts):
+            suffix.append(add_counts(suffix[-1], c))
+        suffix.reverse()
+
+        for i, boundaries in enumerate(self.components):
+            others = add_counts(prefix[i], suffix[i + 1])
+            allowed = 0
+            for count in range(counts[i].bit_length()):
+                if counts[i] >> count & 1 and others << count & window:
+                    allowed |= boundaries.mines_equal(count)
+            boundaries.restrict(allowed)
+        self.counts = Counts(self.components, self.known_mines,
+                             self.known_safe, untouched, self.total_mines)
+        configurations = sum(map(len, self.components))
+        self.stats.update(
+            combine_ms=_since(start), configurations=configurations,
+            pruned=enumerated - configurations,
+            known_mines=len(self.known_mines),
+            known_safe=len(self.known_safe),
+        )
+
+    @staticmethod
+    def _enumeration(cells_to_add: list[Cell],
+                     constraints: list[Constraint]) \
+            -> Generator[None, None, BoundarySet]:
+        """
+        Find all configurations of given cells satisfying given constraints.
+        The cells are added one by one, each time every configuration is
+        extended by both values of the cell that the constraints allow. The
+        generator yields after every column counted, copied or compacted,
+        and returns the result.
+        """
+        boundaries = BoundarySet()
+        # cell: indices of the constraints it appears in
+        watched: dict[Cell, list[int]] = {cell: [] for cell in cells_to_add}
+        for i, (_, cells) in enumerate(constraints):
+            for cell in cells:
+                watched[cell].append(i)
+        # the number of cells of each constraint that are not added yet
+        unset = [len(cells) for _, cells in constraints]
+
+        for y, x in cells_to_add:
+            mine = empty = boundaries.alive
+            for i in watched[y, x]:
+                value, cells = constraints[i]
+                mines = yield from boundaries.counting(
+                    cell for cell in cells if cell in boundaries
+                )
+                # adding a mine would result in an uncovered cell to have
+                # more mines than is its value
+                mine &= less_than(mines, value, boundaries.ones)
+                # making (y, x) empty would make an uncovered cell unable to
+                # have enough mines around
+                empty &= ~less_than(mines, value - unset[i] + 1,
+                                    boundaries.ones)
+                unset[i] -= 1
+            yield from boundaries.extending((y, x), mine, empty)
+            yield
+        return boundaries
+
+
+class BacktrackingSolver(EnumerationSolver):
+    """
+    Enumerates the regions depth-first, see backtracking.search. Slower,
+    but never holds more configurations than the region finally has.
+    """
+    @staticmethod
+    def _enumeration(cells_to_add: list[Cell],
+                     constraints: list[Constraint]) \
+            -> Generator[None, None, BoundarySet]:
+        return (yield from BoundarySet.building(
+            cells_to_add, search(cells_to_add, constraints)
+        ))
+
+
+def _region_key(constraints: list[Constraint]) -> RegionKey:
+    return frozenset((value, frozenset(cells)) for value, cells in constraints)
+
+
+def _going(reached: Progress, goal: Progress | None,
+           deadline: float | None) -> bool:
+    """May the work go on from reached, up to goal or else until deadline?"""
+    if goal is not None:
+        return reached < goal
+    return deadline is None or perf_counter() < deadline
+
+
+def _since(start: float) -> float:
+    """The milliseconds since start, a perf_counter time."""
+    return round((perf_counter() - start) * 1000, 3)
+
+
+@cache
+def _executor(workers: int) -> ProcessPoolExecutor:
+    """The process pool shared by all solvers with given number of workers."""
+    return ProcessPoolExecutor(workers)
+
+
+def _complete(engine: type[EnumerationSolver], cells: list[Cell],
+              constraints: list[Constraint]) -> BoundarySet:
+    """Run an enumeration of engine to the end, in a worker process."""
+    enumeration = engine._enumeration(cells, constraints)
+    while True:
+        try:
+            next(enumeration)
+        except StopIteration as finished:
+            return finished.value
+
+
+# the values of configuration.SOLVER
+SOLVERS: dict[str, Callable[..., BoundarySolver]] = {
+    'enumeration': EnumerationSolver,
+    'backtracking': BacktrackingSolver,
+}
+
+
+def make_solver(name: str, total_mines: int, budget: float | None = None,
+                workers: int = 1, cache: RegionCache | None = None,
+                rng: Random | None = None) -> BoundarySolver:
+    """Create the solver called name in SOLVERS, drawing by rng."""
+    if name not in SOLVERS:
+        raise ValueError(f'unknown solver {name!r}, choose one of '
+                         f'{", ".join(SOLVERS)}')
+    return SOLVERS[name](total_mines, budget, workers, cache, rng)
@@ -0,0 +1,37 @@
+from random import Random
+
+import configuration as conf
+from game import Event, GameCore
+from memo import get_region_cache
+from simulator import BOTS, play
+
+
+def _events(bot: str, height: int, width: int, mines: int,
+            seed: int) -> list[list[Event]]:
+    """The events of every action of a game played by bot."""
+    core = GameCore(height, width, mines, seed)
+    rng = Random(seed)
+    events = []
+    while core.game_state < 2:
+        kind, y, x = BOTS[bot](core, rng)
+        getattr(core, kind)(y, x)
+        events.append(core.take_events())
+    return events
+
+
+def test_cached_regions_draw_the_same(monkeypatch):
+    monkeypatch.setattr(conf, 'SOLVE_BUDGET', None)
+    get_region_cache.cache_clear()
+    cold = _events('random', 9, 9, 20, 53)
+    # the regions of the game are all cached now
+    warm = _events('random', 9, 9, 20, 53)
+    assert cold == warm
+
+
+def test_resumed_game_goes_on_the_same(monkeypatch):
+    # play sets the budget, it is put back after the test
+    monkeypatch.setattr(conf, 'SOLVE_BUDGET', None)
+    # the resumed game used to get the regions from the cache the original
+    # had just filled and to draw other mines
+    game = play('random', 9, 9, 20, 53, None, resume=2)
+    assert game['violations'] == []
@@ -0,0 +1,58 @@
+from __future__ import annotations
+from array import array
+from functools import cache
+
+from boundary import Cell
+
+
+DIRECTIONS: list[tuple[int, int]] = [
+    (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0), (-1, 1)
+]
+
+
+class Topology:
+    """
+    The neighbour tables of a board of given dimensions.
+
+    The cells are indexed row by row. The in-bounds neighbours of the i-th
+    cell are neighbours[offsets[i]:offsets[i + 1]] (compressed sparse rows)
+    and directions holds the index into DIRECTIONS of every such neighbour.
+    The tables are computed once per board size, see get_topology.
+    """
+    def __init__(self, height: int, width: int) -> None:
+        self.height = height
+        self.width = width
+        self.offsets = array('l', [0])
+        self.neighbours = array('l')
+        self.directions = array('b')
+        for y in range(height):
+            for x in range(width):
+                for d, (dy, dx) in enumerate(DIRECTIONS):
+                    if height > y + dy >= 0 <= x + dx < width:
+                        self.neighbours.append((y + dy) * width + x + dx)
+                        self.directions.append(d)
+                self.offsets.append(len(self.neighbours))
+        # the neighbours of every cell as coordinates, in the same order
+        self.around: list[list[tuple[Cell, ...]]] = [
+            [tuple(map(self.cell, self.neighbours[
+                self.offsets[i]:self.offsets[i + 1]
+            ])) for i in range(y * width, (y + 1) * width)]
+            for y in range(height)
+        ]
+
+    def index(self, y: int, x: int) -> int:
+        return y * self.width + x
+
+    def cell(self, i: int) -> Cell:
+        return divmod(i, self.width)
+
+    @staticmethod
+    def direction(cell: Cell, neighbour: Cell) -> int:
+        """Return the index into DIRECTIONS pointing from cell to neighbour."""
+        return DIRECTIONS.index((neighbour[0] - cell[0],
+                                 neighbour[1] - cell[1]))
+
+
+@cache
+def get_topology(height: int, width: int) -> Topology:
+    return Topology(height, width)
@@ -0,0 +1,66 @@
+from __future__ import annotations
+import json
+import sys
+from pathlib import Path
+from time import perf_counter, time
+from typing import Any
+
+
+class Tracer:
+    """
+    The measurements of the actions of a game, a JSON line for each.
+
+    An action begins with begin, the game adds what it measures by note
+    and the line is written by end, which the game calls once the solver
+    has finished with the action, possibly a few polls later. A line holds
+    the action and its cell, the wall time from begin to end in total_ms,
+    the change of the number of allocated memory blocks in blocks and
+    whatever was noted, see GameCore for the names.
+    """
+    def __init__(self, path: str | Path) -> None:
+        # appended to, line buffered so that a crash loses no whole action
+        self.file = open(path, 'a', buffering=1, encoding='utf-8')
+        # the action being measured, None between the actions
+        self.record: dict[str, Any] | None = None
+        # the last action written
+        self.last: dict[str, Any] | None = None
+        self._start: float = 0.0
+        self._blocks: int = 0
+
+    def begin(self, action: str, y: int | None = None,
+              x: int | None = None) -> None:
+        """Start measuring action on (y, x), dropping an unfinished one."""
+        self.record = {'action': action, 'y': y, 'x': x, 'time': time()}
+        self._blocks = sys.getallocatedblocks()
+        self._start = perf_counter()
+
+    def note(self, **values: Any) -> None:
+        """Add values to the action being measured."""
+        if self.record is not None:
+            self.record.update(values)
+
+    def end(self) -> None:
+        """Write the action being measured, if any."""
+        if self.record is None:
+            return
+        self.record['total_ms'] = round((perf_counter() - self._start) *
+                                        1000, 3)
+        self.record['blocks'] = sys.getallocatedblocks() - self._blocks
+        self.file.write(json.dumps(self.record) + '\n')
+        self.last, self.record = self.record, None
+
+    def cancel(self) -> None:
+        """Forget the action being measured."""
+        self.record = None
+
+    def readout(self) -> str:
+        """A short summary of the last action, for the bar."""
+        if self.last is None:
+            return ''
+        text = f'{self.last["total_ms"]:.0f}ms'
+        if 'configurations' in self.last:
+            text += f' {self.last["configurations"]}c'
+        return text
+
+    def close(self) -> None:
+        self.file.close()
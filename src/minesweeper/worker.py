@@ -0,0 +1,62 @@
+from __future__ import annotations
+from collections.abc import Callable
+from queue import Empty, SimpleQueue
+from threading import Thread
+
+
+class SolverWorker:
+    """
+    Runs the jobs touching the solver in a background thread, so that the
+    main loop keeps drawing and reading input meanwhile.
+
+    One job runs at a time. Until poll reports it finished, the solver
+    belongs to the worker and nothing else may read or change it. Without
+    a thread (threaded=False) the jobs run right in submit, which is what
+    scripted games and checks want.
+    """
+    def __init__(self, threaded: bool = True) -> None:
+        self.threaded = threaded
+        # True from submit until poll has seen the job finish
+        self.busy: bool = False
+        self._jobs: SimpleQueue[Callable[[], object]] = SimpleQueue()
+        # None for every finished job, or the exception it raised
+        self._finished: SimpleQueue[BaseException | None] = SimpleQueue()
+        if threaded:
+            Thread(target=self._serve, daemon=True).start()
+
+    def submit(self, job: Callable[[], object]) -> None:
+        """Start job, the previous one must have been polled."""
+        self.busy = True
+        if self.threaded:
+            self._jobs.put(job)
+        else:
+            self._finished.put(self._call(job))
+
+    def poll(self, timeout: float | None = 0) -> bool:
+        """
+        Return True when the submitted job has just finished, waiting at most
+        timeout seconds (None for no limit). An exception raised by the job
+        is raised here, in the main thread.
+        """
+        if not self.busy:
+            return False
+        try:
+            error = self._finished.get(timeout=timeout)
+        except Empty:
+            return False
+        self.busy = False
+        if error is not None:
+            raise error
+        return True
+
+    def _serve(self) -> None:
+        while True:
+            self._finished.put(self._call(self._jobs.get()))
+
+    @staticmethod
+    def _call(job: Callable[[], object]) -> BaseException | None:
+        try:
+            job()
+        except BaseException as error:
+            return error
+        return None